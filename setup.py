@@ -39,6 +39,10 @@ setup(
         "fire",
         "jsonschema",
     ],
+    extras_require={
+        "analysis": ["numpy"],
+        "fast-json": ["orjson"],
+    },
      entry_points={
         'console_scripts': [
             'tromero=tromero.cli:main'
@@ -0,0 +1,52 @@
+import unittest
+
+from tromero import Tromero
+from tromero.bench import StandInServer, percentile, run_benchmark
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class TestBench(unittest.TestCase):
+    def test_percentile(self):
+        self.assertEqual(percentile([5, 1, 3, 2, 4], 50), 3)
+        self.assertEqual(percentile([1, 2, 3], 100), 3)
+        self.assertIsNone(percentile([], 50))
+
+    def test_against_stand_in_server(self):
+        with StandInServer(tokens=8, first_token_latency=0.01, token_latency=0.001) as server:
+            client = Tromero(tromero_key="fake_key")
+            client.add_model_endpoints("stand-in", [server.url], is_base_model=True)
+
+            for stream in (False, True):
+                report = run_benchmark(client, "stand-in", MESSAGES, requests=20, concurrency=4, stream=stream)
+                self.assertEqual(report["error_rate"], 0, report["errors"])
+                self.assertGreater(report["tokens_per_second"], 0)
+                self.assertGreaterEqual(report["latency"]["p99"], report["latency"]["p50"])
+                self.assertLessEqual(report["ttft"]["p50"], report["latency"]["p50"])
+
+            report = run_benchmark(client, "stand-in", MESSAGES, requests=10, concurrency=4, rps=50)
+            self.assertEqual(report["error_rate"], 0, report["errors"])
+            self.assertGreaterEqual(report["duration"], 9 / 50)
+            self.assertGreater(report["send_rps"], 0)
+
+    def test_rps_latency_counts_from_the_scheduled_time(self):
+        # requests take 0.2s at 50 rps, a pool the size of concurrency would fall behind the schedule
+        with StandInServer(tokens=1, first_token_latency=0.2, token_latency=0) as server:
+            client = Tromero(tromero_key="fake_key")
+            client.add_model_endpoints("stand-in", [server.url], is_base_model=True)
+            report = run_benchmark(client, "stand-in", MESSAGES, requests=20, concurrency=1, rps=50)
+        self.assertEqual(report["error_rate"], 0, report["errors"])
+        self.assertGreaterEqual(report["workers"], 10)
+        self.assertGreater(report["send_rps"], 40)
+        self.assertLess(report["send_delay"]["p99"], 0.1)
+        self.assertGreaterEqual(report["latency"]["p50"], 0.2)
+
+    def test_errors_are_counted(self):
+        client = Tromero(tromero_key="fake_key")
+        client.add_model_endpoints("unreachable", ["http://127.0.0.1:9"], is_base_model=True)
+        report = run_benchmark(client, "unreachable", MESSAGES, requests=3, concurrency=1)
+        self.assertEqual(report["error_rate"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero.tromero_requests import TromeroError
+
+
+class TestWarmup(unittest.TestCase):
+    @patch('tromero.wrapper.probe_model', autospec=True)
+    @patch('tromero.wrapper.open_connection', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_warmup_at_construction(self, mock_get_url, mock_open, mock_probe):
+        mock_get_url.side_effect = lambda name, key, location: ([f"https://{name}.example"], name == "base")
+        mock_probe.return_value = True
+
+        client = Tromero(tromero_key="fake_key", warmup_models=["base", "adapter"], warmup_generate=True)
+
+        self.assertEqual(set(client.warmup_times), {"base", "adapter"})
+        self.assertTrue(all(t is not None for t in client.warmup_times.values()))
+        self.assertEqual(client.model_urls["adapter"], "https://adapter.example")
+        self.assertEqual(mock_open.call_count, 2)
+        mock_probe.assert_any_call("NO_ADAPTER", "https://base.example", "fake_key")
+
+    @patch('tromero.wrapper.open_connection', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_failed_warmup_is_reported(self, mock_get_url, mock_open):
+        mock_get_url.side_effect = TromeroError("model not found")
+
+        client = Tromero(tromero_key="fake_key")
+        times = client.warmup("missing")
+
+        self.assertEqual(times, {"missing": None})
+        mock_open.assert_not_called()
+
+
+class TestModelUrls(unittest.TestCase):
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_assignments_write_through_to_the_registry(self, mock_get_url, mock_create, mock_check_model):
+        mock_create.return_value = {"generated_text": "ok", "usage": {"completion_tokens": 1}}
+        mock_check_model.return_value = False
+        client = Tromero(tromero_key="fake_key")
+
+        client.is_base_model["base"] = True
+        client.model_urls["base"] = "https://base.example"
+        client.model_urls["adapter"] = "https://adapter.example"
+        self.assertEqual(dict(client.model_urls), {"base": "https://base.example", "adapter": "https://adapter.example"})
+        self.assertEqual(dict(client.is_base_model), {"base": True, "adapter": False})
+
+        client.chat.completions.create(model="base", messages=[{"role": "user", "content": "hi"}])
+        self.assertEqual(mock_create.call_args[0][:2], ("NO_ADAPTER", "https://base.example"))
+        client.is_base_model["base"] = False
+        client.chat.completions.create(model="base", messages=[{"role": "user", "content": "hi"}])
+        self.assertEqual(mock_create.call_args[0][:2], ("base", "https://base.example"))
+
+        client.model_urls = {"adapter": "https://moved.example"}
+        self.assertEqual(dict(client.model_urls), {"adapter": "https://moved.example"})
+        del client.model_urls["adapter"]
+        self.assertNotIn("adapter", client.model_urls)
+        mock_get_url.assert_not_called()
+
+
+class TestConcurrentCreate(unittest.TestCase):
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_shared_client_under_load(self, mock_get_url, mock_create, mock_check_model):
+        resolutions = []
+        resolution_lock = threading.Lock()
+
+        def get_model_urls(name, key, location):
+            with resolution_lock:
+                resolutions.append(name)
+            time.sleep(0.01)
+            return [f"https://{name}.example"], False
+
+        def create(model, model_url, messages, key, parameters={}):
+            if model == "broken":
+                return {"error": "model failed"}
+            return {"generated_text": f"{model}|{model_url}|{json.loads(messages)[-1]['content']}", "usage": {"completion_tokens": 1}}
+
+        mock_get_url.side_effect = get_model_urls
+        mock_create.side_effect = create
+        mock_check_model.return_value = False
+        client = Tromero(tromero_key="fake_key")
+        models = ["model-a", "model-b", "model-c", "broken"]
+
+        def run(i):
+            model = models[i % len(models)]
+            request = {"model": model, "messages": [{"role": "user", "content": str(i)}], "fallback_model": "model-a"}
+            response = client.chat.completions.create(**request)
+            return i, model, request, response.choices[0].message.content
+
+        with ThreadPoolExecutor(max_workers=64) as executor:
+            results = list(executor.map(run, range(2000)))
+
+        self.assertEqual(sorted(resolutions), sorted(models))
+        for i, model, request, content in results:
+            expected_model = "model-a" if model == "broken" else model
+            self.assertEqual(content, f"{expected_model}|https://{expected_model}.example|{i}")
+            self.assertEqual(request["model"], model)
+            self.assertEqual(len(request["messages"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
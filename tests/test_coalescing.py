@@ -0,0 +1,135 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero.coalescing import SingleFlight, StreamFanout, request_key
+from tromero.json_codec import encode_messages
+from tromero.tromero_utils import mock_openai_format_stream
+
+
+def slow_stream(texts, delay=0.01):
+    for text in texts:
+        time.sleep(delay)
+        yield mock_openai_format_stream(text)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_followers_share_the_leader_result(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.05)
+            return {"generated_text": "shared"}
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(lambda _: single_flight.do("key", fn), range(10)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(single_flight.in_flight(), 0)
+
+    def test_followers_get_the_leader_error(self):
+        single_flight = SingleFlight()
+
+        def fn():
+            time.sleep(0.05)
+            raise ValueError("server error")
+
+        def call(_):
+            try:
+                single_flight.do("key", fn)
+            except ValueError as e:
+                return str(e)
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            self.assertEqual(set(executor.map(call, range(5))), {"server error"})
+
+    def test_key_ignores_dict_order(self):
+        self.assertEqual(request_key("m", [{"role": "user", "content": "hi"}], {"seed": 1, "top_k": 2}, False),
+                         request_key("m", [{"content": "hi", "role": "user"}], {"top_k": 2, "seed": 1}, False))
+        self.assertNotEqual(request_key("m", [], {}, False), request_key("m", [], {}, True))
+        self.assertEqual(request_key("m", encode_messages([{"content": "hi", "role": "user"}]), {}, False),
+                         request_key("m", [{"role": "user", "content": "hi"}], {}, False))
+
+
+class TestStreamFanout(unittest.TestCase):
+    def test_every_consumer_gets_the_whole_stream(self):
+        texts = ["a", "b", "c", "d"]
+        done = []
+        fanout = StreamFanout(slow_stream(texts), on_done=lambda: done.append(1))
+
+        def consume(_):
+            return [chunk.choices[0].delta.content for chunk in fanout.subscribe()]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(consume, range(4)))
+        self.assertEqual(results, [texts] * 4)
+        self.assertEqual(done, [1])
+        # a late consumer replays the buffered chunks
+        self.assertEqual(consume(None), texts)
+
+
+class TestCoalescedCreate(unittest.TestCase):
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_identical_deterministic_requests_are_sent_once(self, mock_get_urls, mock_create, mock_check_model):
+        mock_get_urls.return_value = (["https://model.example"], False)
+        mock_check_model.return_value = False
+        barrier = threading.Barrier(16)
+
+        def create(*args, **kwargs):
+            time.sleep(0.1)
+            return {"generated_text": "answer", "usage": {"completion_tokens": 1}}
+        mock_create.side_effect = create
+
+        client = Tromero(tromero_key="fake_key", coalesce_requests=True)
+
+        def run(_):
+            barrier.wait()
+            return client.chat.completions.create(model="model", messages=[{"role": "user", "content": "hi"}], temperature=0)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(run, range(16)))
+
+        self.assertEqual(mock_create.call_count, 1)
+        self.assertTrue(all(result.choices[0].message.content == "answer" for result in results))
+        # every caller counts as a request, the tokens of the one server call are counted once
+        usage = client.usage.snapshot(by=("model",))[0]
+        self.assertEqual((usage["requests"], usage["completion_tokens"]), (16, 1))
+
+        client.chat.completions.create(model="model", messages=[{"role": "user", "content": "hi"}], temperature=0.7)
+        self.assertEqual(mock_create.call_count, 2)
+
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_requests_with_different_key_order_are_sent_once(self, mock_get_urls, mock_create, mock_check_model):
+        mock_get_urls.return_value = (["https://model.example"], False)
+        mock_check_model.return_value = False
+        barrier = threading.Barrier(8)
+
+        def create(*args, **kwargs):
+            time.sleep(0.1)
+            return {"generated_text": "answer", "usage": {"completion_tokens": 1}}
+        mock_create.side_effect = create
+
+        client = Tromero(tromero_key="fake_key", coalesce_requests=True)
+        orders = [{"role": "user", "content": "hi"}, {"content": "hi", "role": "user"}]
+
+        def run(i):
+            barrier.wait()
+            return client.chat.completions.create(model="model", messages=[orders[i % 2]], temperature=0)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(run, range(8)))
+        self.assertEqual(mock_create.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from tromero.fine_tuning import Datasets, read_dataset_manifest
+from tromero.tromero_requests import TromeroError
+
+VALID = {"messages": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]}
+INVALID = {"messages": [{"role": "user", "content": "hi"}]}
+
+
+def write_jsonl(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+class TestCreateMany(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        for name in ["a", "b", "c", "d"]:
+            write_jsonl(os.path.join(self.path, f"{name}.jsonl"), [VALID] * 3)
+        write_jsonl(os.path.join(self.path, "bad.jsonl"), [VALID, INVALID])
+        with open(os.path.join(self.path, "notes.txt"), "w") as f:
+            f.write("not a dataset")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_manifest(self):
+        manifest = os.path.join(self.path, "manifest.jsonl")
+        write_jsonl(manifest, [{"file": "a.jsonl", "name": "first", "tags": "x"}, {"file": "b.jsonl"}])
+        datasets = read_dataset_manifest(manifest, description="shared", tags=["y"])
+        self.assertEqual(datasets, [
+            {"file": os.path.join(self.path, "a.jsonl"), "name": "first", "description": "shared", "tags": ["x"]},
+            {"file": os.path.join(self.path, "b.jsonl"), "name": "b", "description": "shared", "tags": ["y"]},
+        ])
+
+    @patch('tromero.fine_tuning.create_dataset', autospec=True)
+    @patch('tromero.fine_tuning.save_logs', autospec=True)
+    @patch('tromero.fine_tuning.upload_file_to_url', autospec=True)
+    @patch('tromero.fine_tuning.get_signed_url', autospec=True)
+    def test_directory(self, mock_signed_url, mock_upload, mock_save_logs, mock_create_dataset):
+        mock_signed_url.side_effect = lambda key: ("https://upload.example", f"file-{time.monotonic()}")
+        uploading = []
+        most_uploading = []
+        lock = threading.Lock()
+
+        def upload(signed_url, file_path):
+            with lock:
+                uploading.append(file_path)
+                most_uploading.append(len(uploading))
+            time.sleep(0.05)
+            with lock:
+                uploading.remove(file_path)
+            if file_path.endswith("c.jsonl"):
+                raise TromeroError("upload failed")
+        mock_upload.side_effect = upload
+
+        results = Datasets("fake_key").create_many(self.path, tags=["team"], max_workers=4, raw=True)
+
+        self.assertEqual([result["name"] for result in results], ["a", "b", "bad", "c", "d"])
+        statuses = {result["name"]: (result["status"], result["stage"]) for result in results}
+        self.assertEqual(statuses, {"a": ("created", None), "b": ("created", None), "bad": ("invalid", "validate"),
+                                    "c": ("failed", "upload"), "d": ("created", None)})
+        self.assertIn("Missing \"assistant\" message", results[2]["error"])
+        self.assertEqual(mock_create_dataset.call_count, 3)
+        self.assertEqual(results[0]["tags"][0], "team")
+        self.assertGreater(max(most_uploading), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
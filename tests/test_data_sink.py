@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tromero.data_sink import LocalDataSink
+
+
+def record(content, tags, creation_time):
+    return {"messages": [{"role": "user", "content": content}, {"role": "assistant", "content": "ok"}],
+            "model": "model", "kwargs": {}, "creation_time": creation_time, "tags": tags}
+
+
+class TestLocalDataSink(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # registered first so it runs after the sinks are closed
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_records_are_partitioned_and_indexed(self):
+        sink = LocalDataSink(self.directory, max_shard_bytes=1000)
+        self.addCleanup(sink.close)
+        for i in range(30):
+            sink.write(record(f"question {i}", "support", f"2026-10-01T10:{i:02d}:00"))
+        sink.write(record("other", "sales,eu", "2026-10-02T09:00:00"))
+        sink.write(record("untagged", "", "2026-10-02T09:00:00"))
+
+        shards = sink.shards()
+        support_shards = sink.shards(tags="support")
+        self.assertGreater(len(support_shards), 1)
+        self.assertEqual(sum(entry["records"] for entry in support_shards), 30)
+        self.assertEqual(len(shards), len(support_shards) + 2)
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, "sales+eu", "2026-10-02"))), 1)
+        self.assertEqual([entry["tags"] for entry in sink.shards(tags="eu")], [["sales", "eu"]])
+
+    def test_time_filter_and_export(self):
+        sink = LocalDataSink(self.directory)
+        self.addCleanup(sink.close)
+        for i in range(10):
+            sink.write(record(f"question {i}", "support", f"2026-10-01T10:{i:02d}:00"))
+
+        records = list(sink.iter_records(tags="support", start="2026-10-01T10:03:00", end="2026-10-01T10:05:00"))
+        self.assertEqual([r["messages"][0]["content"] for r in records], ["question 3", "question 4", "question 5"])
+        self.assertEqual(sink.shards(start="2026-10-02"), [])
+
+        export_path = os.path.join(self.directory, "export.jsonl")
+        self.assertEqual(sink.export(export_path, tags=["support"]), 10)
+        with open(export_path) as file:
+            self.assertEqual(set(json.loads(file.readline())), {"messages"})
+
+    def test_sanitised_names_do_not_mix_tag_sets(self):
+        sink = LocalDataSink(self.directory)
+        self.addCleanup(sink.close)
+        sink.write(record("spaced", "a b", "2026-10-01T10:00:00"))
+        sink.write(record("underscored", "a_b", "2026-10-01T10:00:00"))
+        sink.flush()
+        self.assertEqual([r["messages"][0]["content"] for r in sink.iter_records(tags="a b")], ["spaced"])
+        self.assertEqual([r["messages"][0]["content"] for r in sink.iter_records(tags="a_b")], ["underscored"])
+
+    def test_queries_do_not_rotate_shards(self):
+        sink = LocalDataSink(self.directory)
+        self.addCleanup(sink.close)
+        for i in range(5):
+            sink.write(record(f"question {i}", "support", f"2026-10-01T10:{i:02d}:00"))
+            entries = sink.shards(tags="support")
+            self.assertEqual(len(entries), 1)
+            self.assertTrue(entries[0]["open"])
+            self.assertEqual(len(list(sink.iter_records(tags="support"))), i + 1)
+        sink.flush()
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, "support", "2026-10-01"))), 1)
+        self.assertEqual(len(list(sink.iter_records(tags="support"))), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
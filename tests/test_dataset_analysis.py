@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import unittest
+
+from tromero.dataset_analysis import analyze_file
+
+
+class WordTokenizer:
+    def count(self, text):
+        return len(text.split())
+
+
+def example(words):
+    return {"messages": [{"role": "user", "content": "word " * words}, {"role": "assistant", "content": "ok"}]}
+
+
+class TestAnalyzeFile(unittest.TestCase):
+    def setUp(self):
+        lines = [json.dumps(example(10 + i % 5)) for i in range(20)]
+        lines[7] = json.dumps(example(500))
+        lines.append(lines[0])
+        lines.append("not json")
+        handle, self.file_path = tempfile.mkstemp(suffix=".jsonl")
+        with os.fdopen(handle, "w") as file:
+            file.write("\n".join(lines) + "\n")
+
+    def tearDown(self):
+        os.remove(self.file_path)
+
+    def test_report(self):
+        base_model_data = {"supported_context_len": 100, "training_time_per_log": 0.5, "training_time_y_intercept": 30}
+        report = analyze_file(self.file_path, base_model_data=base_model_data, epochs=2, tokenizer=WordTokenizer(),
+                              cost_per_1000_tokens=1.0)
+
+        self.assertEqual(report.examples, 21)
+        self.assertEqual(report.invalid_lines, [22])
+        self.assertEqual(report.outliers, [8])
+        self.assertEqual(report.over_context, [8])
+        self.assertIn(21, report.duplicates)
+        self.assertEqual(report.token_percentiles[100], 500 + 1 + 4 * 2 + 2)
+        self.assertEqual(sum(report.histogram[0]), 21)
+        self.assertEqual(report.estimated_training_seconds, 30 + 0.5 * 21 * 2)
+        self.assertAlmostEqual(report.estimated_cost, report.total_tokens * 2 / 1000)
+
+    def test_without_base_model(self):
+        report = analyze_file(self.file_path, tokenizer=WordTokenizer())
+        self.assertIsNone(report.estimated_training_seconds)
+        self.assertEqual(report.over_context, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero.bench import StandInServer
+from tromero.tromero_requests import TromeroError
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+# the client created before forking, as in a gunicorn preload app
+_client = None
+_parent_http_client = None
+
+
+def worker(i):
+    assert _client._client is not _parent_http_client
+    response = _client.chat.completions.create(model="model", messages=MESSAGES, save_data=True)
+    _client.data_sink.flush()
+    # a client created in the worker finds the url in the shared cache instead of resolving it
+    worker_client = Tromero(tromero_key="fake_key", url_cache_path=_client.url_cache.path)
+    worker_response = worker_client.chat.completions.create(model="model", messages=MESSAGES)
+    return os.getpid(), response.choices[0].message.content, worker_response.choices[0].message.content
+
+
+@unittest.skipUnless(hasattr(os, "register_at_fork") and "fork" in multiprocessing.get_all_start_methods(), "needs fork")
+class TestForkedWorkers(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_client_survives_fork(self, mock_get_urls, mock_check_model):
+        global _client, _parent_http_client
+        mock_check_model.return_value = False
+        with StandInServer(tokens=4, first_token_latency=0, token_latency=0) as server:
+            mock_get_urls.return_value = ([server.url], True)
+            _client = Tromero(tromero_key="fake_key", local_data_dir=os.path.join(self.directory, "data"),
+                              url_cache_path=os.path.join(self.directory, "urls.json"))
+            # the parent has a pooled connection, a running sink writer and an open shard when it forks
+            _client.chat.completions.create(model="model", messages=MESSAGES, save_data=True)
+            mock_get_urls.side_effect = TromeroError("workers should not resolve the model")
+            _parent_http_client = _client._client
+
+            with multiprocessing.get_context("fork").Pool(3) as pool:
+                results = pool.map(worker, range(6))
+
+            _client.chat.completions.create(model="model", messages=MESSAGES, save_data=True)
+
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(content == worker_content == "tok " * 4 for _, content, worker_content in results))
+        records = list(_client.data_sink.iter_records())
+        _client.data_sink.close()
+        self.assertEqual(len(records), 1 + 6 + 1)
+        self.assertEqual(mock_get_urls.call_count, 1)
+        self.assertIs(_client._client, _parent_http_client)
+
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    def test_url_cache_is_per_account(self, mock_get_urls):
+        path = os.path.join(self.directory, "urls.json")
+        mock_get_urls.return_value = (["https://account-a.example"], False)
+        Tromero(tromero_key="key-a", url_cache_path=path)._resolve_model_url("model")
+        mock_get_urls.return_value = (["https://account-b.example"], False)
+        urls, _ = Tromero(tromero_key="key-b", url_cache_path=path)._resolve_model_url("model")
+        self.assertEqual(urls, ["https://account-b.example"])
+        self.assertEqual(mock_get_urls.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
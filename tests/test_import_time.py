@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+
+# Seconds a cold `import` may add on top of starting the interpreter
+IMPORT_BUDGET = float(os.getenv("TROMERO_IMPORT_BUDGET", "0.5"))
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=PACKAGE_ROOT, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stdout.strip()
+
+
+def import_time(code):
+    # best of three to keep the test stable on noisy machines
+    baseline = min(run_python("pass")[0] for _ in range(3))
+    return min(run_python(code)[0] for _ in range(3)) - baseline
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_does_not_load_heavy_dependencies(self):
+        _, output = run_python("import sys, tromero; print(sorted(m for m in ('openai', 'jsonschema', 'requests', 'fire') if m in sys.modules))")
+        self.assertEqual(output, "[]")
+
+    def test_cli_does_not_load_client_dependencies(self):
+        _, output = run_python("import sys, tromero.cli; print(sorted(m for m in ('openai', 'jsonschema', 'fire') if m in sys.modules))")
+        self.assertEqual(output, "[]")
+
+    def test_client_is_loaded_on_access(self):
+        _, output = run_python("import tromero; print(tromero.Tromero.__module__)")
+        self.assertEqual(output, "tromero.wrapper")
+
+    def test_import_time_budget(self):
+        self.assertLess(import_time("import tromero"), IMPORT_BUDGET)
+        self.assertLess(import_time("import tromero.cli"), IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
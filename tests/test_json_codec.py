@@ -0,0 +1,59 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero import json_codec
+
+MESSAGES = [{"role": "system", "content": "Answer in French."}, {"role": "user", "content": "héllo \"there\""}]
+
+
+class TestJsonCodec(unittest.TestCase):
+    def tearDown(self):
+        json_codec.use()
+
+    def test_backends_round_trip(self):
+        for backend in json_codec.BACKENDS:
+            try:
+                json_codec.use(backend)
+            except ImportError:
+                continue
+            encoded = json_codec.dumps({"messages": MESSAGES, "n": 1.5})
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(json_codec.loads(encoded), {"messages": MESSAGES, "n": 1.5})
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ValueError):
+            json_codec.use("yaml")
+
+    def test_unsupported_values_fall_back_to_the_standard_library(self):
+        self.assertEqual(json.loads(json_codec.dumps({1: 2 ** 70})), {"1": 2 ** 70})
+
+    def test_generate_request(self):
+        expected = {"adapter_name": "model", "messages": MESSAGES, "parameters": {"max_new_tokens": 5}}
+        body = json_codec.encode_generate_request("model", MESSAGES, {"max_new_tokens": 5})
+        self.assertEqual(json.loads(body), expected)
+        body = json_codec.encode_generate_request("model", json_codec.encode_messages(MESSAGES), {"max_new_tokens": 5})
+        self.assertEqual(json.loads(body), expected)
+
+
+class TestFallbackReusesMessages(unittest.TestCase):
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    def test_messages_are_encoded_once(self, mock_create):
+        mock_create.side_effect = lambda model, *args, **kwargs: (
+            {"error": "model failed"} if model == "primary" else {"generated_text": "Bonjour", "usage": {"completion_tokens": 1}})
+        client = Tromero(tromero_key="fake_key")
+        client.add_model_endpoints("primary", ["https://primary.example"])
+        client.add_model_endpoints("backup", ["https://backup.example"])
+
+        with patch('tromero.wrapper.encode_messages', wraps=json_codec.encode_messages) as mock_encode:
+            response = client.chat.completions.create(model="primary", messages=MESSAGES, fallback_model="backup")
+
+        self.assertEqual(response.choices[0].message.content, "Bonjour")
+        self.assertEqual(mock_encode.call_count, 1)
+        sent = [call[0][2] for call in mock_create.call_args_list]
+        self.assertIs(sent[0], sent[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import unittest
+
+from tromero import Tromero
+from tromero.json_stream import IncrementalJsonParser
+from tromero.tromero_utils import mock_openai_format_stream
+
+DOCUMENT = {"people": [{"name": "Ada \"A\" Lovelace", "age": 36}, {"name": "Alan", "age": None}], "complete": True, "score": -1.5e3}
+
+
+def feed_in_pieces(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed += parser.feed(text[i:i + size])
+    return completed
+
+
+class TestIncrementalJsonParser(unittest.TestCase):
+    def test_any_split_gives_the_same_document(self):
+        text = json.dumps(DOCUMENT)
+        for size in (1, 2, 7, len(text)):
+            parser = IncrementalJsonParser()
+            feed_in_pieces(parser, text, size)
+            self.assertTrue(parser.done)
+            self.assertEqual(parser.value, DOCUMENT)
+
+    def test_fields_are_reported_as_they_close(self):
+        parser = IncrementalJsonParser()
+        self.assertEqual(parser.feed('{"people": [{"name": "Ada", "a'), [(("people", 0, "name"), "Ada")])
+        self.assertEqual(parser.value, {"people": [{"name": "Ada"}]})
+        self.assertEqual(parser.feed('ge": 36}, '), [(("people", 0, "age"), 36), (("people", 0), {"name": "Ada", "age": 36})])
+        self.assertFalse(parser.done)
+
+    def test_top_level_scalar_needs_close(self):
+        parser = IncrementalJsonParser()
+        self.assertEqual(parser.feed("12"), [])
+        self.assertEqual(parser.close(), [((), 12)])
+        self.assertTrue(parser.done)
+
+    def test_invalid_json_raises(self):
+        with self.assertRaises(ValueError):
+            IncrementalJsonParser().feed('{"a": 1}}')
+
+    def test_grammar_is_enforced(self):
+        for text in ['{"a" "b"}', '[1 2]', '{]', '[}', '{"a":1,}', '[,,1]', '{"a"}', '{"a":1 "b":2}', '[1,]',
+                     '{:1}', '{"a"::1}', '["a":1]', '{1:2}', ']', '1 2']:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parser = IncrementalJsonParser()
+                    feed_in_pieces(parser, text, 1)
+                    parser.close()
+
+    def test_malformed_stream_fails_guided_schema_validation(self):
+        from tromero.schemas import SchemaValidationError
+        client = Tromero(tromero_key="fake_key")
+        schema = {"type": "object", "properties": {"a": {"type": "string"}}}
+        chunks = [mock_openai_format_stream(text) for text in ['{"a" ', '"b"}']]
+        stream = client.chat.completions._stream_response(iter(chunks), {}, {}, False, guided_schema=schema, parse_json=True)
+        with self.assertRaises(SchemaValidationError):
+            list(stream)
+
+
+class TestStreamParsing(unittest.TestCase):
+    def test_chunks_carry_parsed_fields(self):
+        client = Tromero(tromero_key="fake_key")
+        text = json.dumps(DOCUMENT)
+        chunks = [mock_openai_format_stream(text[i:i + 5]) for i in range(0, len(text), 5)]
+        stream = client.chat.completions._stream_response(iter(chunks), {}, {}, False, parse_json=True)
+
+        fields = []
+        for chunk in stream:
+            fields += chunk.parsed_fields
+        self.assertEqual(chunk.parsed, DOCUMENT)
+        self.assertIn((("people", 1, "name"), "Alan"), fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import unittest
+from unittest.mock import patch
+
+from tromero.load_balancer import EndpointPool
+from tromero.tromero_requests import TromeroError, get_model_urls
+
+
+def record(pool, endpoint, latency=None, **kwargs):
+    # a finished request on a chosen endpoint
+    endpoint.outstanding += 1
+    pool.release(endpoint, latency, **kwargs)
+
+
+class TestEndpointPool(unittest.TestCase):
+    def test_ewma_prefers_the_fastest_endpoint(self):
+        pool = EndpointPool(["https://uk.example", "https://us.example"])
+        for url, latency in (("https://uk.example", 0.5), ("https://us.example", 0.1)):
+            endpoint = next(e for e in pool.endpoints if e.url == url)
+            record(pool, endpoint, latency)
+        picked = [pool.acquire().url for _ in range(5)]
+        self.assertEqual(picked, ["https://us.example"] * 4 + ["https://uk.example"])
+
+    def test_least_outstanding(self):
+        pool = EndpointPool(["a", "b", "c"], strategy="least_outstanding")
+        picked = {pool.acquire().url for _ in range(3)}
+        self.assertEqual(picked, {"a", "b", "c"})
+
+    def test_failing_endpoint_is_ejected(self):
+        pool = EndpointPool(["bad", "good"], strategy="least_outstanding", max_failures=2)
+        bad = pool.endpoints[0]
+        for _ in range(2):
+            pool.release(pool.acquire(), 0.1, ok=False)
+        self.assertTrue(pool.stats()[0]["ejected"])
+        self.assertEqual({pool.acquire().url for _ in range(3)}, {"good"})
+        self.assertEqual(bad.failures, 2)
+
+    def test_all_ejected_still_serves(self):
+        pool = EndpointPool(["only"], max_failures=1)
+        pool.release(pool.acquire(), 0.1, ok=False)
+        self.assertEqual(pool.acquire().url, "only")
+
+    def test_streams_and_requests_keep_separate_latencies(self):
+        pool = EndpointPool(["a", "b"])
+        a, b = pool.endpoints
+        # a generates slowly but starts streaming fast, b is the other way round
+        record(pool, a, 2.0)
+        record(pool, a, ttft=0.1)
+        record(pool, b, 0.5)
+        record(pool, b, ttft=0.4)
+        record(pool, b, ok=True)  # an answer without a sample, e.g. a rejected request
+        self.assertEqual((a.ewma_latency, a.ewma_ttft, b.ewma_latency, b.ewma_ttft), (2.0, 0.1, 0.5, 0.4))
+        self.assertEqual(pool.acquire().url, "b")
+        self.assertEqual(pool.acquire(stream=True).url, "a")
+
+    def test_invalid_strategy(self):
+        with self.assertRaises(ValueError):
+            EndpointPool(["a"], strategy="random")
+
+
+class TestEndpointFailures(unittest.TestCase):
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    def test_only_server_errors_count_as_failures(self, mock_create, mock_check_model):
+        from tromero import Tromero
+        mock_check_model.return_value = False
+        client = Tromero(tromero_key="fake_key")
+        client.add_model_endpoints("model", ["https://only.example"], is_base_model=True)
+        messages = [{"role": "user", "content": "hi"}]
+
+        for error in (TromeroError("bad request", status_code=400), TromeroError("unauthorized", status_code=401)):
+            mock_create.side_effect = error
+            for _ in range(3):
+                with self.assertRaises(TromeroError):
+                    client.chat.completions.create(model="model", messages=messages, use_fallback=False)
+        stats = client.endpoint_stats()["model"][0]
+        self.assertEqual((stats["requests"], stats["failures"], stats["ewma_latency"]), (6, 0, 0.0))
+
+        for error in (TromeroError("server error", status_code=503), TromeroError("An error occurred: timed out")):
+            mock_create.side_effect = error
+            with self.assertRaises(TromeroError):
+                client.chat.completions.create(model="model", messages=messages, use_fallback=False)
+        self.assertEqual(client.endpoint_stats()["model"][0]["failures"], 2)
+
+
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    def test_answers_without_a_generation_eject_the_endpoint(self, mock_create, mock_check_model):
+        from tromero import Tromero
+        mock_check_model.return_value = False
+
+        def create(model, model_url, messages, key, parameters={}):
+            if model_url == "https://bad.example":
+                return {"error": "model failed"}
+            return {"generated_text": "ok", "usage": {"completion_tokens": 1}}
+        mock_create.side_effect = create
+        client = Tromero(tromero_key="fake_key")
+        client.add_model_endpoints("model", ["https://bad.example", "https://good.example"], is_base_model=True)
+
+        for _ in range(20):
+            client.chat.completions.create(model="model", messages=[{"role": "user", "content": "hi"}], use_fallback=False)
+        bad, good = client.endpoint_stats()["model"]
+        self.assertEqual(bad["failures"], 3)
+        self.assertTrue(bad["ejected"])
+        self.assertEqual(good["requests"], 17)
+
+    def test_unsampled_endpoint_costs_the_mean_latency(self):
+        pool = EndpointPool(["a", "b", "c"])
+        a, b, c = pool.endpoints
+        for endpoint, latency in ((a, 0.2), (b, 0.4)):
+            record(pool, endpoint, latency)
+        # c has no sample and is costed at 0.3: it is picked after a but before b
+        self.assertEqual([pool.acquire().url for _ in range(2)], ["a", "c"])
+
+
+class TestGetModelUrls(unittest.TestCase):
+    @patch('tromero.tromero_requests.get_model_url', autospec=True)
+    def test_regions_without_the_model_are_skipped(self, mock_get_url):
+        def get_model_url(name, key, location):
+            if location == "eu":
+                raise TromeroError("not deployed")
+            return f"https://{location}.example", False
+        mock_get_url.side_effect = get_model_url
+
+        self.assertEqual(get_model_urls("model", "key", ["uk", "eu", "us"]), (["https://uk.example", "https://us.example"], False))
+        with self.assertRaises(TromeroError):
+            get_model_urls("model", "key", "eu")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+
+from tromero.fine_tuning import TromeroModels
+from tromero.tromero_requests import TromeroError
+
+
+def model_response(state):
+    return {"message": {"state": state}}
+
+
+class TestWaitUntilReady(unittest.TestCase):
+    @patch('tromero.fine_tuning.probe_model', autospec=True)
+    @patch('tromero.fine_tuning.get_model_url', autospec=True)
+    @patch('tromero.fine_tuning.get_model_request', autospec=True)
+    def test_models_are_yielded_as_they_become_ready(self, mock_get_model, mock_get_url, mock_probe):
+        states = {
+            "fast": iter(["deployed"]),
+            "slow": iter(["deploying", "deploying", "deployed"]),
+        }
+        mock_get_model.side_effect = lambda name, key: model_response(next(states[name]))
+        mock_get_url.side_effect = lambda name, key, location: (f"https://{name}.example", False)
+        mock_probe.return_value = True
+        ready_calls = []
+
+        models = TromeroModels("fake_key", on_model_ready=lambda *args: ready_calls.append(args))
+        ready = list(models.iter_ready(["slow", "fast"], timeout=5, probe=True, poll_interval=0.01))
+
+        self.assertEqual(ready, ["fast", "slow"])
+        self.assertEqual(mock_get_model.call_count, 4)
+        self.assertEqual(mock_probe.call_count, 2)
+        self.assertIn(("slow", "https://slow.example", False), ready_calls)
+
+    @patch('tromero.fine_tuning.probe_model', autospec=True)
+    @patch('tromero.fine_tuning.get_model_url', autospec=True)
+    @patch('tromero.fine_tuning.get_model_request', autospec=True)
+    def test_failed_probe_is_retried(self, mock_get_model, mock_get_url, mock_probe):
+        mock_get_model.return_value = model_response("deployed")
+        mock_get_url.return_value = ("https://model.example", True)
+        mock_probe.side_effect = [False, True]
+
+        ready = TromeroModels("fake_key").wait_until_ready("model", timeout=5, probe=True, poll_interval=0.01)
+
+        self.assertEqual(list(ready), ["model"])
+        mock_probe.assert_called_with("NO_ADAPTER", "https://model.example", "fake_key")
+
+    @patch('tromero.fine_tuning.get_model_request', autospec=True)
+    def test_timeout_raises(self, mock_get_model):
+        mock_get_model.return_value = model_response("deploying")
+        with self.assertRaises(TromeroError):
+            TromeroModels("fake_key").wait_until_ready(["model"], timeout=0.05, poll_interval=0.01)
+
+    @patch('tromero.fine_tuning.get_model_url', autospec=True)
+    @patch('tromero.fine_tuning.get_model_request', autospec=True)
+    def test_transient_api_errors_are_retried(self, mock_get_model, mock_get_url):
+        mock_get_model.side_effect = [TromeroError("An error occurred: connection reset"),
+                                      TromeroError("bad gateway", status_code=502), model_response("deployed")]
+        mock_get_url.return_value = ("https://model.example", False)
+
+        ready = TromeroModels("fake_key").wait_until_ready(["model"], timeout=5, poll_interval=0.01)
+
+        self.assertEqual(list(ready), ["model"])
+        self.assertEqual(mock_get_model.call_count, 3)
+
+        mock_get_model.side_effect = TromeroError("model not found", status_code=404)
+        with self.assertRaises(TromeroError):
+            TromeroModels("fake_key").wait_until_ready(["model"], timeout=5, poll_interval=0.01)
+        self.assertEqual(mock_get_model.call_count, 4)
+
+    @patch('tromero.fine_tuning.get_model_request', autospec=True)
+    def test_failed_model_raises(self, mock_get_model):
+        mock_get_model.return_value = model_response("failed")
+        with self.assertRaises(TromeroError):
+            TromeroModels("fake_key").wait_until_ready(["model"], timeout=5, poll_interval=0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import patch
+
+from jsonschema.exceptions import SchemaError
+
+from tromero.schemas import SchemaRegistry, SchemaValidationError, canonicalize_schema
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'name': {'type': 'string'},
+        'age': {'type': 'integer'}
+    }
+}
+
+
+class TestSchemaRegistry(unittest.TestCase):
+    def test_equal_schemas_share_a_key(self):
+        reordered = {'properties': {'age': {'type': 'integer'}, 'name': {'type': 'string'}}, 'type': 'object'}
+        self.assertEqual(canonicalize_schema(SCHEMA)[1], canonicalize_schema(reordered)[1])
+        self.assertEqual(canonicalize_schema(SCHEMA)[1], canonicalize_schema('{"type": "object", "properties": {"name": {"type": "string"}, "age": {"type": "integer"}}}')[1])
+
+    def test_schema_is_checked_once(self):
+        registry = SchemaRegistry()
+        with patch('tromero.schemas.check_schema', autospec=True) as mock_check:
+            first = registry.get_validator(SCHEMA)
+            second = registry.get_validator(dict(SCHEMA))
+        self.assertIs(first, second)
+        mock_check.assert_called_once()
+
+    def test_least_recently_used_is_evicted(self):
+        registry = SchemaRegistry(max_size=2)
+        schemas = [{'type': 'object', 'properties': {f'field{i}': {'type': 'string'}}} for i in range(3)]
+        first = registry.get_validator(schemas[0])
+        registry.get_validator(schemas[1])
+        registry.get_validator(schemas[0])
+        registry.get_validator(schemas[2])
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get_validator(schemas[0]), first)
+
+    def test_invalid_schema_raises(self):
+        with self.assertRaises(SchemaError):
+            SchemaRegistry().get_validator({'type': 'object', 'properties': {'name': {}}})
+
+    def test_validate_json(self):
+        registry = SchemaRegistry()
+        self.assertEqual(registry.validate_json(SCHEMA, '{"name": "Ada", "age": 36}'), {"name": "Ada", "age": 36})
+        with self.assertRaises(SchemaValidationError):
+            registry.validate_json(SCHEMA, '{"name": "Ada", "age": "36"}')
+        with self.assertRaises(SchemaValidationError):
+            registry.validate_json(SCHEMA, '{"name": "Ada", ')
+
+
+if __name__ == '__main__':
+    unittest.main()
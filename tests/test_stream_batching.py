@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero.stream_batching import batch_chunks, batching_options
+from tromero.tromero_utils import mock_openai_format_stream
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def stream(texts):
+    return (mock_openai_format_stream(text) for text in texts)
+
+
+def contents(chunks):
+    return [chunk.choices[0].delta.content for chunk in chunks]
+
+
+class TestBatchChunks(unittest.TestCase):
+    def test_first_chunk_is_not_delayed(self):
+        chunks = contents(batch_chunks(stream(["a", "b", "c", "d"]), interval=60, max_bytes=1000))
+        self.assertEqual(chunks, ["a", "bcd"])
+
+    def test_max_bytes(self):
+        chunks = contents(batch_chunks(stream(["a", "bb", "cc", "dd", "e"]), interval=60, max_bytes=4))
+        self.assertEqual(chunks, ["a", "bbcc", "dde"])
+
+    def test_interval(self):
+        chunks = contents(batch_chunks(stream(["a", "b", "c"]), interval=0, max_bytes=1000))
+        self.assertEqual(chunks, ["a", "b", "c"])
+
+    def test_restart_flushes_and_is_not_delayed(self):
+        chunks = list(stream(["Hel", "l", "Hello", " there", "!"]))
+        chunks[2].restarted = True
+        batched = list(batch_chunks(iter(chunks), interval=60, max_bytes=1000))
+        self.assertEqual(contents(batched), ["Hel", "l", "Hello", " there!"])
+        self.assertTrue(batched[2].restarted)
+
+    def test_end_of_sequence_stays_its_own_chunk(self):
+        chunks = contents(batch_chunks(stream(["a", "b", "c", "</s>"]), interval=60, max_bytes=1000))
+        self.assertEqual(chunks, ["a", "bc", "</s>"])
+
+    def test_parsed_fields_are_merged(self):
+        chunks = list(stream(["{", '"a":1,', '"b":2', "}"]))
+        for chunk, fields in zip(chunks, [[], [(("a",), 1)], [], [(("b",), 2)]]):
+            chunk.parsed_fields = fields
+        batched = list(batch_chunks(iter(chunks), interval=60, max_bytes=1000))
+        self.assertEqual(batched[1].parsed_fields, [(("a",), 1), (("b",), 2)])
+
+    def test_options(self):
+        self.assertIsNone(batching_options(None))
+        self.assertEqual(batching_options(True), (0.02, 256))
+        self.assertEqual(batching_options({"max_bytes": 64}), (0.02, 64))
+
+
+class TestClientStreamBatching(unittest.TestCase):
+    @patch('tromero.wrapper.tromero_model_create_stream', autospec=True)
+    def test_create_batches_stream(self, mock_stream):
+        mock_stream.side_effect = lambda *args, **kwargs: (stream(["Hel", "lo", " the", "re"]), None)
+        client = Tromero(tromero_key="fake_key", stream_batching={"interval": 60})
+        client.add_model_endpoints("model", ["https://model.example"])
+
+        chunks = list(client.chat.completions.create(model="model", messages=MESSAGES, stream=True))
+        self.assertEqual(contents(chunks), ["Hel", "lo there"])
+        chunks = list(client.chat.completions.create(model="model", messages=MESSAGES, stream=True, stream_batching=False))
+        self.assertEqual(contents(chunks), ["Hel", "lo", " the", "re"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero.tromero_requests import StreamError, StreamResponse, TromeroError
+from tromero.tromero_utils import mock_openai_format_stream
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class FakeResponse:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+def event(text):
+    return ("data:" + json.dumps({"token": {"text": text}}) + "\n\n").encode("utf-8")
+
+
+def broken_stream(texts):
+    for text in texts:
+        yield mock_openai_format_stream(text)
+    raise StreamError("Stream interrupted: Read timed out.")
+
+
+class TestStreamResponse(unittest.TestCase):
+    def test_events(self):
+        response = StreamResponse(FakeResponse([event("a"), event("b") + event("c"), b":keep-alive\n"]))
+        self.assertEqual([chunk.choices[0].delta.content for chunk in response], ["a", "b", "c"])
+
+    def test_event_split_across_reads(self):
+        first, second = event("hello"), event("there")
+        reads = [first[:10], first[10:] + second[:3], second[3:-1], second[-1:]]
+        response = StreamResponse(FakeResponse(reads))
+        self.assertEqual([chunk.choices[0].delta.content for chunk in response], ["hello", "there"])
+
+    def test_last_event_without_newline(self):
+        response = StreamResponse(FakeResponse([event("a"), event("b").strip()]))
+        self.assertEqual([chunk.choices[0].delta.content for chunk in response], ["a", "b"])
+
+    def test_malformed_event_raises(self):
+        response = StreamResponse(FakeResponse([event("a"), b"data:{not json\n\n"]))
+        with self.assertRaises(StreamError):
+            list(response)
+
+    def test_broken_connection_raises(self):
+        response = StreamResponse(FakeResponse([event("a"), ConnectionError("connection reset")]))
+        with self.assertRaises(StreamError):
+            list(response)
+
+
+class TestMidStreamFallback(unittest.TestCase):
+    def setUp(self):
+        self.client = Tromero(tromero_key="fake_key")
+        self.client.add_model_endpoints("primary", ["https://primary.example"])
+        self.client.add_model_endpoints("backup", ["https://backup.example"])
+
+    @patch('tromero.wrapper.tromero_model_create_stream', autospec=True)
+    def test_switches_to_fallback_model(self, mock_stream):
+        def create_stream(model, model_url, messages, key, parameters={}, timeout=None):
+            if model == "primary":
+                return broken_stream(["Hel"]), None
+            return iter([mock_openai_format_stream(text) for text in ["Hello", " there"]]), None
+        mock_stream.side_effect = create_stream
+
+        chunks = list(self.client.chat.completions.create(model="primary", messages=MESSAGES, stream=True, fallback_model="backup"))
+
+        self.assertEqual([chunk.choices[0].delta.content for chunk in chunks], ["Hel", "Hello", " there"])
+        self.assertFalse(hasattr(chunks[0], "fallback_model"))
+        self.assertEqual([chunk.restarted for chunk in chunks[1:]], [True, False])
+        self.assertTrue(all(chunk.fallback_model == "backup" for chunk in chunks[1:]))
+        primary_stats = self.client.endpoint_stats()["primary"][0]
+        self.assertEqual(primary_stats["failures"], 1)
+        self.assertEqual(primary_stats["outstanding"], 0)
+
+    @patch('tromero.wrapper.tromero_model_create_stream', autospec=True)
+    def test_error_is_raised_without_fallback(self, mock_stream):
+        mock_stream.return_value = (broken_stream(["Hel"]), None)
+        stream = self.client.chat.completions.create(model="primary", messages=MESSAGES, stream=True)
+        with self.assertRaises(StreamError):
+            list(stream)
+
+    @patch('tromero.wrapper.tromero_model_create_stream', autospec=True)
+    def test_error_status_falls_back_at_connection(self, mock_stream):
+        def create_stream(model, model_url, messages, key, parameters={}, timeout=None):
+            if model == "primary":
+                return None, StreamError("Stream request failed with status 503")
+            return iter([mock_openai_format_stream("Hi")]), None
+        mock_stream.side_effect = create_stream
+
+        chunks = list(self.client.chat.completions.create(model="primary", messages=MESSAGES, stream=True, fallback_model="backup"))
+        self.assertEqual([chunk.choices[0].delta.content for chunk in chunks], ["Hi"])
+
+    @patch('tromero.wrapper.tromero_model_create_stream', autospec=True)
+    def test_timeout_before_the_answer_falls_back(self, mock_stream):
+        def create_stream(model, model_url, messages, key, parameters={}, timeout=None):
+            if model == "primary":
+                raise TromeroError("An error occurred: Read timed out.")
+            return iter([mock_openai_format_stream("Hi")]), None
+        mock_stream.side_effect = create_stream
+
+        for coalesce in (False, True):
+            chunks = list(self.client.chat.completions.create(model="primary", messages=MESSAGES, stream=True, fallback_model="backup",
+                                                              coalesce=coalesce))
+            self.assertEqual([chunk.choices[0].delta.content for chunk in chunks], ["Hi"])
+        primary_stats = self.client.endpoint_stats()["primary"][0]
+        self.assertEqual((primary_stats["failures"], primary_stats["outstanding"]), (2, 0))
+
+        with self.assertRaises(TromeroError):
+            self.client.chat.completions.create(model="primary", messages=MESSAGES, stream=True, use_fallback=False)
+
+
+class TestStreamRelease(unittest.TestCase):
+    def setUp(self):
+        self.client = Tromero(tromero_key="fake_key")
+        self.client.add_model_endpoints("primary", ["https://primary.example"])
+
+    @patch('tromero.wrapper.tromero_model_create_stream', autospec=True)
+    def test_unread_and_closed_streams_release_the_endpoint(self, mock_stream):
+        responses = []
+
+        def create_stream(model, model_url, messages, key, parameters={}, timeout=None):
+            responses.append(StreamResponse(FakeResponse([event("a"), event("b")])))
+            responses[-1].response.close = lambda: responses.remove(responses[-1])
+            return responses[-1], None
+        mock_stream.side_effect = create_stream
+
+        stream = self.client.chat.completions.create(model="primary", messages=MESSAGES, stream=True)
+        self.assertEqual(self.client.endpoint_stats()["primary"][0]["outstanding"], 1)
+        del stream
+        self.assertEqual(self.client.endpoint_stats()["primary"][0]["outstanding"], 0)
+        self.assertEqual(responses, [])
+
+        stream = self.client.chat.completions.create(model="primary", messages=MESSAGES, stream=True)
+        self.assertEqual(next(stream).choices[0].delta.content, "a")
+        stream.close()
+        stats = self.client.endpoint_stats()["primary"][0]
+        self.assertEqual((stats["outstanding"], stats["requests"], stats["failures"]), (0, 2, 0))
+        self.assertEqual(responses, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
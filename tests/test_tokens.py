@@ -0,0 +1,97 @@
+import json
+import time
+import unittest
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero.tromero_requests import TromeroError
+from tromero.tokens import (HeuristicTokenizer, PromptTooLongError, count_message_tokens, get_tokenizer,
+                            register_tokenizer, truncate_messages)
+
+
+class WordTokenizer:
+    def count(self, text):
+        return len(text.split())
+
+
+def conversation(turns):
+    messages = [{"role": "system", "content": "be brief"}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " + "word " * 10})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "word " * 10})
+    messages.append({"role": "user", "content": "last question"})
+    return messages
+
+
+class TestTokens(unittest.TestCase):
+    def test_heuristic_counts(self):
+        tokenizer = HeuristicTokenizer()
+        self.assertEqual(tokenizer.count(""), 0)
+        self.assertEqual(tokenizer.count("abcdefgh"), 2)
+        self.assertEqual(tokenizer.count("a, b, c"), 5)
+
+    def test_registered_tokenizer_is_used(self):
+        register_tokenizer("test-base-model", WordTokenizer())
+        tokenizer = get_tokenizer("test-base-model")
+        self.assertEqual(count_message_tokens([{"role": "user", "content": "one two three"}], tokenizer), 3 + 4 + 2)
+
+    def test_truncate_keeps_system_and_last_message(self):
+        messages = conversation(5)
+        kept, tokens = truncate_messages(messages, 60, WordTokenizer())
+        self.assertEqual(kept[0], messages[0])
+        self.assertEqual(kept[-1], messages[-1])
+        self.assertEqual(kept[1]["role"], "user")
+        self.assertLessEqual(tokens, 60)
+        self.assertLess(len(kept), len(messages))
+        with self.assertRaises(PromptTooLongError):
+            truncate_messages(messages, 5, WordTokenizer())
+
+
+class TestPreflight(unittest.TestCase):
+    @patch('tromero.wrapper.MockCompletions.check_model', autospec=True)
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    @patch('tromero.wrapper.get_model_urls', autospec=True)
+    @patch('tromero.wrapper.get_model_request', autospec=True)
+    def test_oversize_prompt_fails_before_the_request(self, mock_get_model, mock_get_urls, mock_create, mock_check_model):
+        mock_get_model.return_value = {"message": {"base_model_data": {"supported_context_len": 100, "model_name": "test-base-model", "hf_repo": None}}}
+        mock_get_urls.return_value = (["https://model.example"], False)
+        mock_create.return_value = {"generated_text": "ok", "usage": {"completion_tokens": 1}}
+        mock_check_model.return_value = False
+        register_tokenizer("test-base-model", WordTokenizer())
+        client = Tromero(tromero_key="fake_key", preflight=True)
+
+        with self.assertRaises(PromptTooLongError):
+            client.chat.completions.create(model="model", messages=conversation(5))
+        mock_create.assert_not_called()
+
+        response = client.chat.completions.create(model="model", messages=conversation(5), auto_truncate=True, max_new_tokens=20)
+        sent_messages = json.loads(mock_create.call_args[0][2])
+        self.assertLess(len(sent_messages), len(conversation(5)))
+        self.assertLessEqual(response.usage.prompt_tokens, 80)
+        mock_get_model.assert_called_once()
+
+    @patch('tromero.wrapper.MODEL_CONTEXT_RETRY_SECONDS', 0.05)
+    @patch('tromero.wrapper.get_model_request', autospec=True)
+    def test_only_definite_answers_are_cached_forever(self, mock_get_model):
+        register_tokenizer("test-base-model", WordTokenizer())
+        found = {"message": {"base_model_data": {"supported_context_len": 100, "model_name": "test-base-model", "hf_repo": None}}}
+        mock_get_model.side_effect = [TromeroError("An error occurred: connection refused"), found,
+                                      TromeroError("Model not found", status_code=404)]
+        client = Tromero(tromero_key="fake_key")
+
+        self.assertIsNone(client._get_model_context("model")[0])
+        self.assertIsNone(client._get_model_context("model")[0])
+        self.assertEqual(mock_get_model.call_count, 1)
+        time.sleep(0.05)
+        self.assertEqual(client._get_model_context("model")[0], 100)
+        self.assertEqual(client._get_model_context("model")[0], 100)
+        self.assertEqual(mock_get_model.call_count, 2)
+
+        self.assertIsNone(client._get_model_context("base-model")[0])
+        time.sleep(0.05)
+        self.assertIsNone(client._get_model_context("base-model")[0])
+        self.assertEqual(mock_get_model.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from tromero import Tromero
+from tromero.usage import BudgetExceededError, UsageTracker
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class TestUsageTracker(unittest.TestCase):
+    def test_counts_from_many_threads(self):
+        usage = UsageTracker()
+
+        def work():
+            for _ in range(100):
+                usage.record("model-a", ["team-a", "chat"], 10, 5, 0.5)
+                usage.record("model-b", [], 1, 1, 0.1, fallback=True)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        by_tag = {row["tag"]: row for row in usage.snapshot(by=("tag",))}
+        self.assertEqual(by_tag["team-a"]["requests"], 800)
+        self.assertEqual(by_tag["team-a"]["prompt_tokens"], 8000)
+        self.assertEqual(by_tag["team-a"]["completion_tokens"], 4000)
+        self.assertAlmostEqual(by_tag["team-a"]["latency"], 400)
+        self.assertEqual(by_tag[None]["requests"], 800)
+        by_fallback = {row["fallback"]: row["requests"] for row in usage.snapshot(by=("fallback",))}
+        self.assertEqual(by_fallback, {False: 1600, True: 800})
+
+        usage.reset()
+        self.assertEqual(usage.snapshot(), [])
+
+    def test_finished_threads_are_merged(self):
+        usage = UsageTracker()
+        for _ in range(50):
+            thread = threading.Thread(target=usage.record, args=("model-a", ["chat"], 10, 5, 0.5))
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(usage._shards), 1)
+        self.assertEqual(usage.snapshot(by=("model",))[0]["prompt_tokens"], 500)
+
+    def test_invalid_group(self):
+        with self.assertRaises(ValueError):
+            UsageTracker().snapshot(by=("user",))
+
+    def test_export_to_file(self):
+        usage = UsageTracker()
+        usage.record("model-a", ["chat"], 10, 5, 0.5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "usage.jsonl")
+            usage.export(path)
+            usage.export(path)
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["usage"], [{"model": "model-a", "tag": "chat", "fallback": False, "requests": 1,
+                                              "prompt_tokens": 10, "completion_tokens": 5, "latency": 0.5}])
+
+    def test_periodic_export(self):
+        usage = UsageTracker()
+        exported = threading.Event()
+        usage.export_every(0.01, lambda snapshot: exported.set())
+        self.assertTrue(exported.wait(5))
+        usage.stop_export()
+
+
+class TestClientUsage(unittest.TestCase):
+    def setUp(self):
+        self.client = Tromero(tromero_key="fake_key")
+        for model in ["big", "small", "broken"]:
+            self.client.add_model_endpoints(model, [f"https://{model}.example"])
+
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    def test_usage_by_model_and_fallback(self, mock_create):
+        mock_create.side_effect = lambda model, *args, **kwargs: (
+            {"error": "model failed"} if model == "broken" else
+            {"generated_text": "Hi", "usage": {"prompt_tokens": 7, "completion_tokens": 2}})
+
+        self.client.chat.completions.create(model="big", messages=MESSAGES, tags=["chat"])
+        self.client.chat.completions.create(model="broken", messages=MESSAGES, tags=["chat"], fallback_model="small")
+
+        rows = {(row["model"], row["fallback"]): row for row in self.client.usage.snapshot()}
+        self.assertEqual(set(rows), {("big", False), ("small", True)})
+        self.assertEqual(rows[("big", False)]["prompt_tokens"], 7)
+        self.assertEqual(rows[("small", True)]["completion_tokens"], 2)
+
+    @patch('tromero.wrapper.tromero_model_create_stream', autospec=True)
+    def test_stream_usage(self, mock_stream):
+        from tromero.tromero_utils import mock_openai_format_stream
+        mock_stream.return_value = (iter([mock_openai_format_stream(text) for text in ["Hel", "lo"]]), None)
+        list(self.client.chat.completions.create(model="big", messages=MESSAGES, stream=True))
+        self.assertEqual(self.client.usage.snapshot(by=("model",))[0]["completion_tokens"], 2)
+
+    @patch('tromero.wrapper.tromero_model_create', autospec=True)
+    def test_budgets(self, mock_create):
+        mock_create.return_value = {"generated_text": "Hi", "usage": {"prompt_tokens": 60, "completion_tokens": 40}}
+        self.client.usage.set_budget("team-a", max_tokens=100, downgrade_model="small")
+        self.client.usage.set_budget("team-b", max_tokens=100)
+
+        for tag in ["team-a", "team-b"]:
+            self.client.chat.completions.create(model="big", messages=MESSAGES, tags=[tag])
+        self.assertEqual(self.client.usage.budgets()["team-a"]["used_tokens"], 100)
+
+        self.client.chat.completions.create(model="big", messages=MESSAGES, tags=["team-a"])
+        self.assertEqual(mock_create.call_args[0][0], "small")
+        with self.assertRaises(BudgetExceededError):
+            self.client.chat.completions.create(model="big", messages=MESSAGES, tags=["team-b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
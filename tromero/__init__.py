@@ -1 +1,21 @@
-from .wrapper import Tromero
+# Attributes are loaded on first access (PEP 562) so that `import tromero` and the cli do not pay
+# for importing openai and jsonschema until the client is actually used.
+_lazy_attributes = {
+    "Tromero": "tromero.wrapper",
+    "TromeroError": "tromero.tromero_requests",
+}
+
+__all__ = list(_lazy_attributes)
+
+
+def __getattr__(name):
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_lazy_attributes[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,183 @@
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# with rps, enough workers are started to keep to the rate while requests take up to this many seconds
+RPS_LATENCY_ALLOWANCE = 10
+MAX_RPS_WORKERS = 1024
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[index]
+
+
+def _summary(values):
+    return {f"p{p}": percentile(values, p) for p in (50, 90, 95, 99)} if values else {}
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_request(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        max_new_tokens = request.get("parameters", {}).get("max_new_tokens") or self.server.tokens
+        return min(max_new_tokens, self.server.tokens)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        tokens = self._read_request()
+        time.sleep(self.server.first_token_latency)
+        if self.path.endswith("/generate_stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(tokens):
+                if i:
+                    time.sleep(self.server.token_latency)
+                event = ("data:" + json.dumps({"token": {"text": "tok "}}) + "\n\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        elif self.path.endswith("/generate"):
+            time.sleep(self.server.token_latency * max(tokens - 1, 0))
+            body = json.dumps({"generated_text": "tok " * tokens,
+                               "usage": {"completion_tokens": tokens}}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+
+class StandInServer:
+    """Local http server answering /generate and /generate_stream like a deployed model, for offline benchmarks"""
+    def __init__(self, host="127.0.0.1", port=0, tokens=32, first_token_latency=0.05, token_latency=0.005):
+        self._server = ThreadingHTTPServer((host, port), _StandInHandler)
+        self._server.daemon_threads = True
+        self._server.tokens = tokens
+        self._server.first_token_latency = first_token_latency
+        self._server.token_latency = token_latency
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tromero-stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def _run_request(client, model, messages, stream, parameters, scheduled=None):
+    # latency counts from the scheduled send time, so time spent waiting for a worker is not hidden
+    sent = time.perf_counter()
+    start = sent if scheduled is None else scheduled
+    first_token = None
+    tokens = 0
+    try:
+        response = client.chat.completions.create(model=model, messages=messages, stream=stream,
+                                                  save_data=False, use_fallback=False, **parameters)
+        if stream:
+            for chunk in response:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                tokens += 1
+        else:
+            if not hasattr(response, "choices"):
+                raise ValueError(f"No choices in response: {response}")
+            usage = getattr(response, "usage", None)
+            tokens = getattr(usage, "completion_tokens", 0) or 0
+        latency = time.perf_counter() - start
+        return {"latency": latency, "ttft": first_token if stream else latency, "tokens": tokens, "error": None,
+                "sent": sent, "send_delay": sent - start}
+    except Exception as e:
+        return {"latency": time.perf_counter() - start, "ttft": None, "tokens": 0, "error": str(e),
+                "sent": sent, "send_delay": sent - start}
+
+
+def run_benchmark(client, model, messages, requests=100, concurrency=8, rps=None, stream=False, parameters=None):
+    """Sends `requests` chat completions to the model, either keeping `concurrency` requests in flight
+    or, if rps is given, starting requests at that rate. With rps, latencies are measured from the time
+    each request was due, and the report compares the achieved send rate with the target.
+    Returns the report as a dict."""
+    parameters = parameters or {}
+    results = []
+    workers = concurrency
+    if rps:
+        workers = min(requests, MAX_RPS_WORKERS, max(concurrency, math.ceil(rps * RPS_LATENCY_ALLOWANCE)))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if rps:
+            futures = []
+            for i in range(requests):
+                scheduled = started + i / rps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(_run_request, client, model, messages, stream, parameters, scheduled))
+            results = [future.result() for future in futures]
+        else:
+            results = list(executor.map(lambda _: _run_request(client, model, messages, stream, parameters), range(requests)))
+    duration = time.perf_counter() - started
+
+    succeeded = [result for result in results if result["error"] is None]
+    errors = [result["error"] for result in results if result["error"] is not None]
+    tokens = sum(result["tokens"] for result in succeeded)
+    per_request_rates = [result["tokens"] / result["latency"] for result in succeeded if result["latency"] > 0]
+    send_rps = None
+    if rps and len(results) > 1:
+        send_span = max(result["sent"] for result in results) - started
+        send_rps = (len(results) - 1) / send_span if send_span > 0 else None
+        if send_rps is not None and send_rps < 0.95 * rps:
+            print(f"Warning: requests were sent at {send_rps:.1f} requests per second, below the target of {rps}.")
+    return {
+        "model": model,
+        "stream": stream,
+        "requests": requests,
+        "concurrency": concurrency,
+        "target_rps": rps,
+        "duration": duration,
+        "achieved_rps": len(results) / duration if duration else None,
+        "send_rps": send_rps,
+        "send_delay": _summary([result["send_delay"] for result in results]) if rps else None,
+        "workers": workers,
+        "error_rate": len(errors) / len(results) if results else 0,
+        "errors": sorted(set(errors))[:10],
+        "latency": _summary([result["latency"] for result in succeeded]),
+        "ttft": _summary([result["ttft"] for result in succeeded if result["ttft"] is not None]),
+        "tokens_per_second": tokens / duration if duration else None,
+        "tokens_per_second_per_request": sum(per_request_rates) / len(per_request_rates) if per_request_rates else None,
+    }
@@ -1,16 +1,63 @@
-import fire
-
 from tromero.fine_tuning import TromeroModels, TromeroData, FineTuningJob, Datasets
 import os 
 
 
 class TromeroCli():
+    # The sub clients are created on first access so a command only builds the one it uses
     def __init__(self):
-        tromero_key=os.getenv("TROMERO_API_KEY")
-        self.models = TromeroModels(tromero_key, raw_default=True)
-        self.fine_tuning_jobs = FineTuningJob(tromero_key, raw_default=True)
-        self.data = TromeroData(tromero_key)
-        self.datasets = Datasets(tromero_key, raw_default=True)
+        self._tromero_key = os.getenv("TROMERO_API_KEY")
+
+    @property
+    def models(self):
+        if "_models" not in self.__dict__:
+            self._models = TromeroModels(self._tromero_key, raw_default=True)
+        return self._models
+
+    @property
+    def fine_tuning_jobs(self):
+        if "_fine_tuning_jobs" not in self.__dict__:
+            self._fine_tuning_jobs = FineTuningJob(self._tromero_key, raw_default=True)
+        return self._fine_tuning_jobs
+
+    @property
+    def data(self):
+        if "_data" not in self.__dict__:
+            self._data = TromeroData(self._tromero_key)
+        return self._data
+
+    @property
+    def datasets(self):
+        if "_datasets" not in self.__dict__:
+            self._datasets = Datasets(self._tromero_key, raw_default=True)
+        return self._datasets
+
+    def bench(self, model, prompt="Write a short story about a robot.", requests=100, concurrency=8, rps=None,
+              stream=False, max_new_tokens=64, model_url=None, stand_in=False, output=None):
+        """Load tests a model through chat.completions.create and reports latency percentiles, time to
+        first token, tokens per second and error rate. Use model_url to target a replica directly or
+        stand_in to run against a local stand-in server."""
+        from tromero.wrapper import Tromero
+        from tromero.bench import StandInServer, run_benchmark
+        import json
+        server = StandInServer().start() if stand_in else None
+        try:
+            client = Tromero(self._tromero_key or "", save_data_default=False)
+            if server is not None:
+                model_url = server.url
+            if model_url:
+                client.add_model_endpoints(model, [model_url], is_base_model=bool(stand_in))
+            messages = [{"role": "user", "content": prompt}]
+            report = run_benchmark(client, model, messages, requests=int(requests), concurrency=int(concurrency),
+                                   rps=float(rps) if rps else None, stream=bool(stream),
+                                   parameters={"max_new_tokens": int(max_new_tokens)})
+        finally:
+            if server is not None:
+                server.stop()
+        if output:
+            with open(output, "w") as file:
+                json.dump(report, file, indent=2)
+        return report
 
 def main():
+    import fire
     fire.Fire(TromeroCli)
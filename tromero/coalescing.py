@@ -0,0 +1,155 @@
+import hashlib
+import json
+import threading
+from .tromero_utils import mock_openai_format_stream
+from .json_codec import RawJson
+from . import json_codec
+from . import forking
+
+
+def is_deterministic(parameters):
+    """True if the generation parameters always give the same output for the same prompt"""
+    return parameters.get("do_sample") is False or parameters.get("temperature") == 0 or "seed" in parameters
+
+
+def request_key(model, messages, parameters, stream):
+    """Canonical hash of a request, identical requests get the same key whatever the key order of their dicts.
+    messages can also be encoded with json_codec.encode_messages."""
+    if isinstance(messages, RawJson):
+        messages = json_codec.loads(bytes(messages))
+    request = {"model": model, "messages": messages, "parameters": parameters, "stream": bool(stream)}
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class StreamFanout:
+    """Shares one stream between several consumers.
+
+    The source is pulled by whichever consumer needs the next chunk first, the others wait for it.
+    Every consumer gets all the chunks from the start of the stream, as new chunk objects."""
+    def __init__(self, source, on_done=None):
+        self._source = iter(source)
+        self._texts = []
+        self._done = False
+        self._error = None
+        self._pulling = False
+        self._condition = threading.Condition()
+        self._on_done = on_done
+
+    def _pull(self):
+        text = None
+        done = False
+        error = None
+        try:
+            chunk = next(self._source)
+            text = chunk.choices[0].delta.content
+        except StopIteration:
+            done = True
+        except Exception as e:
+            done = True
+            error = e
+        with self._condition:
+            if done:
+                self._done = True
+                self._error = error
+            else:
+                self._texts.append(text)
+            self._pulling = False
+            self._condition.notify_all()
+        if done and self._on_done:
+            self._on_done()
+
+    def subscribe(self):
+        index = 0
+        while True:
+            pull = False
+            with self._condition:
+                while index >= len(self._texts) and not self._done and self._pulling:
+                    self._condition.wait()
+                if index < len(self._texts):
+                    text = self._texts[index]
+                    index += 1
+                elif self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                else:
+                    self._pulling = True
+                    pull = True
+            if pull:
+                self._pull()
+                continue
+            yield mock_openai_format_stream(text)
+
+
+class SingleFlight:
+    """Runs identical in-flight requests once. Followers wait for the leader's result (or error)"""
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        forking.register(self)
+
+    def _after_fork_in_child(self):
+        # the leaders of the in-flight calls are threads of the parent process
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            return call, True
+
+    def _forget(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def do(self, key, fn):
+        call, leader = self._join(key)
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self._forget(key, call)
+            call.event.set()
+
+    def share_stream(self, key, start):
+        """Returns a consumer of the stream for key, calling start() to open it if it is not in flight.
+        The stream stays shared until it ends, so requests arriving mid-stream also join it."""
+        call, leader = self._join(key)
+        if leader:
+            try:
+                call.result = StreamFanout(start(), on_done=lambda: self._forget(key, call))
+            except Exception as e:
+                call.error = e
+                self._forget(key, call)
+                raise
+            finally:
+                call.event.set()
+        else:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+        return call.result.subscribe()
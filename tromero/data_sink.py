@@ -0,0 +1,227 @@
+import atexit
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+from . import forking
+
+INDEX_FILE = "index.jsonl"
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def _partition_name(tags):
+    if not tags:
+        return "untagged"
+    name = "+".join(_UNSAFE_CHARS.sub("_", tag) for tag in tags)
+    if name != "+".join(tags) or name == "untagged":
+        # sanitising can give different tag sets the same name, e.g. "a b" and "a_b"
+        name += "-" + hashlib.sha256("\n".join(tags).encode("utf-8")).hexdigest()[:8]
+    return name
+
+
+class _Flush:
+    def __init__(self, close):
+        self.close = close
+        self.done = threading.Event()
+        self.open_entries = []
+
+
+class _Shard:
+    def __init__(self, directory, path, tags, date):
+        # path is relative to the sink directory
+        self.path = path
+        self.tags = tags
+        self.date = date
+        self.records = 0
+        self.bytes = 0
+        self.first_time = None
+        self.last_time = None
+        self.file = gzip.open(os.path.join(directory, path), "wb")
+
+    def write(self, line, creation_time):
+        self.file.write(line)
+        self.records += 1
+        self.bytes += len(line)
+        self.first_time = self.first_time or creation_time
+        self.last_time = creation_time
+
+    def sync(self):
+        # the data written so far can be read back, without ending the gzip stream
+        self.file.flush()
+        return self.entry()
+
+    def close(self):
+        self.file.close()
+        return self.entry()
+
+    def entry(self):
+        return {"path": self.path, "tags": self.tags, "date": self.date, "records": self.records, "bytes": self.bytes,
+                "first_time": self.first_time, "last_time": self.last_time}
+
+
+class LocalDataSink:
+    """Writes saved data records to local gzip compressed jsonl shards instead of sending them to Tromero.
+
+    Shards are partitioned as <directory>/<tags>/<date>/shard-<n>-<pid>.jsonl.gz and rotated when they reach
+    max_shard_bytes of uncompressed data. Every closed shard is listed in <directory>/index.jsonl with
+    its tags and time range, so records can be filtered without opening every shard. Writing happens
+    on a background thread, write() only queues the record."""
+    def __init__(self, directory, max_shard_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_shard_bytes = max_shard_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._shards = {}
+        self._index_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+        forking.register(self)
+
+    def _after_fork_in_child(self):
+        # the writer thread and its queued records belong to the parent. The open shards are the
+        # parent's too: point their file descriptors at /dev/null so nothing the child does
+        # (including garbage collection flushing their buffers) writes into them.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        for shard in self._shards.values():
+            os.dup2(devnull, shard.file.fileobj.fileno())
+        os.close(devnull)
+        self._orphaned_shards = list(self._shards.values())
+        self._shards = {}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._index_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="tromero-data-sink", daemon=True)
+                    self._thread.start()
+
+    def write(self, record):
+        self._ensure_started()
+        self._queue.put(record)
+
+    def flush(self, close=True):
+        """Waits for the queued records to be written. The open shards are closed so they appear in the
+        index, or with close=False only flushed to disk. Returns the index entries of the shards left open"""
+        if self._thread is None:
+            return []
+        request = _Flush(close)
+        self._queue.put(request)
+        request.done.wait()
+        return request.open_entries
+
+    def close(self):
+        self.flush()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if isinstance(item, _Flush):
+                    if item.close:
+                        self._close_shards()
+                    else:
+                        item.open_entries = [dict(shard.sync(), open=True) for shard in self._shards.values()]
+                else:
+                    self._write_record(item)
+            except Exception as e:
+                print(f"Error writing saved data locally: {e}")
+            finally:
+                if isinstance(item, _Flush):
+                    item.done.set()
+
+    def _write_record(self, record):
+        creation_time = record.get("creation_time") or datetime.datetime.now().isoformat()
+        date = creation_time[:10]
+        tags = [tag for tag in (record.get("tags") or "").split(",") if tag]
+        # shards are kept by the exact tags, so every shard holds a single tag set
+        partition = tuple(tags)
+        shard = self._shards.get(partition)
+        if shard is not None and (shard.date != date or shard.bytes >= self.max_shard_bytes):
+            self._close_shard(partition)
+            shard = None
+        if shard is None:
+            shard = self._open_shard(partition, tags, date)
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        shard.write(line, creation_time)
+
+    def _open_shard(self, partition, tags, date):
+        partition_name = _partition_name(tags)
+        directory = os.path.join(self.directory, partition_name, date)
+        os.makedirs(directory, exist_ok=True)
+        number = len([name for name in os.listdir(directory) if name.startswith("shard-")])
+        # the pid keeps shard names unique when forked workers share the directory
+        name = f"shard-{number:05d}-{os.getpid()}.jsonl.gz"
+        shard = _Shard(self.directory, os.path.join(partition_name, date, name), tags, date)
+        self._shards[partition] = shard
+        return shard
+
+    def _close_shard(self, partition):
+        entry = self._shards.pop(partition).close()
+        with self._index_lock:
+            with open(os.path.join(self.directory, INDEX_FILE), "a") as index:
+                index.write(json.dumps(entry) + "\n")
+
+    def _close_shards(self):
+        for partition in list(self._shards):
+            self._close_shard(partition)
+
+    def shards(self, tags=None, start=None, end=None):
+        """Index entries of the shards with any of the tags and records between start and end (iso format strings).
+        Shards still being written are included with "open": True, they are flushed but not closed"""
+        open_entries = self.flush(close=False)
+        if type(tags) == str:
+            tags = [tags]
+        path = os.path.join(self.directory, INDEX_FILE)
+        entries = []
+        if os.path.exists(path):
+            with self._index_lock:
+                with open(path) as index:
+                    entries = [json.loads(line) for line in index if line.strip()]
+        entries += open_entries
+        return [entry for entry in entries
+                if (not tags or set(tags) & set(entry["tags"]))
+                and (start is None or entry["last_time"] >= start)
+                and (end is None or entry["first_time"] <= end)]
+
+    def iter_records(self, tags=None, start=None, end=None):
+        if type(tags) == str:
+            tags = [tags]
+        for entry in self.shards(tags, start, end):
+            for record in self._read_shard(entry):
+                if start is not None and record["creation_time"] < start:
+                    continue
+                if end is not None and record["creation_time"] > end:
+                    continue
+                if tags and not set(tags) & set(record["tags"].split(",")):
+                    continue
+                yield record
+
+    def _read_shard(self, entry):
+        # an open shard has no gzip trailer yet and may have grown, only the bytes listed in its entry are read
+        remaining = entry["bytes"]
+        with gzip.open(os.path.join(self.directory, entry["path"]), "rb") as shard:
+            while remaining > 0:
+                line = shard.readline()
+                if not line:
+                    break
+                remaining -= len(line)
+                yield json.loads(line)
+
+    def export(self, file_path, tags=None, start=None, end=None):
+        """Writes the matching records as a training ready jsonl file, which can be uploaded
+        with TromeroData.upload. Returns the number of examples"""
+        examples = 0
+        with open(file_path, "w") as file:
+            for record in self.iter_records(tags, start, end):
+                file.write(json.dumps({"messages": record["messages"]}, ensure_ascii=False) + "\n")
+                examples += 1
+        return examples
@@ -0,0 +1,130 @@
+import hashlib
+import json
+from array import array
+from .tokens import count_message_tokens, get_tokenizer
+
+
+def _load_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Dataset analysis needs numpy, install it with `pip install numpy`.")
+    return numpy
+
+
+def _get(data, key):
+    # base model data can be the dict from the api or a BaseModelData
+    if data is None:
+        return None
+    if isinstance(data, dict):
+        return data.get(key)
+    return getattr(data, key, None)
+
+
+def _example_hash(messages):
+    canonical = json.dumps(messages, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return int.from_bytes(hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class DatasetReport:
+    def __init__(self, file_path, examples, invalid_lines, total_tokens, token_percentiles, message_percentiles,
+                 histogram, outliers, duplicates, over_context, estimated_training_seconds=None, estimated_cost=None):
+        self.file_path = file_path
+        self.examples = examples
+        self.invalid_lines = invalid_lines
+        self.total_tokens = total_tokens
+        self.token_percentiles = token_percentiles
+        self.message_percentiles = message_percentiles
+        self.histogram = histogram
+        self.outliers = outliers
+        self.duplicates = duplicates
+        self.over_context = over_context
+        self.estimated_training_seconds = estimated_training_seconds
+        self.estimated_cost = estimated_cost
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+def read_examples(file_path):
+    """Yields (line number, messages) for every example of a jsonl training file, and (line number, None) for invalid lines"""
+    with open(file_path, "r") as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                messages = json.loads(line)["messages"]
+            except (ValueError, KeyError, TypeError):
+                yield line_number, None
+                continue
+            if not isinstance(messages, list):
+                yield line_number, None
+                continue
+            yield line_number, messages
+
+
+def analyze_file(file_path, base_model_data=None, epochs=1, tokenizer=None, bins=20, cost_per_1000_tokens=None):
+    """Scans a jsonl training file once, keeping only per example lengths in compact arrays, and
+    reports token and message length statistics, outliers, duplicates and, when base_model_data
+    is given, an estimate of the training time (and cost if cost_per_1000_tokens is given)."""
+    np = _load_numpy()
+    if tokenizer is None:
+        tokenizer = get_tokenizer(_get(base_model_data, "model_name"), _get(base_model_data, "hf_repo"))
+
+    line_numbers = array("q")
+    token_lengths = array("q")
+    message_counts = array("q")
+    hashes = array("q")
+    invalid_lines = []
+    for line_number, messages in read_examples(file_path):
+        if messages is None:
+            invalid_lines.append(line_number)
+            continue
+        line_numbers.append(line_number)
+        token_lengths.append(count_message_tokens(messages, tokenizer))
+        message_counts.append(len(messages))
+        hashes.append(_example_hash(messages))
+
+    line_numbers = np.frombuffer(line_numbers, dtype=np.int64)
+    token_lengths = np.frombuffer(token_lengths, dtype=np.int64)
+    message_counts = np.frombuffer(message_counts, dtype=np.int64)
+    hashes = np.frombuffer(hashes, dtype=np.int64)
+    examples = int(token_lengths.size)
+    percentiles = [0, 50, 90, 99, 100]
+    if examples == 0:
+        return DatasetReport(file_path, 0, invalid_lines, 0, {}, {}, ([], []), [], [], [])
+
+    token_percentiles = dict(zip(percentiles, np.percentile(token_lengths, percentiles).tolist()))
+    message_percentiles = dict(zip(percentiles, np.percentile(message_counts, percentiles).tolist()))
+    counts, edges = np.histogram(token_lengths, bins=bins)
+
+    # outliers are beyond three interquartile ranges from the quartiles
+    q1, q3 = np.percentile(token_lengths, [25, 75])
+    spread = 3 * (q3 - q1)
+    outliers = line_numbers[(token_lengths > q3 + spread) | (token_lengths < q1 - spread)]
+
+    # every occurrence of a repeated example after the first
+    order = np.argsort(hashes, kind="stable")
+    sorted_hashes = hashes[order]
+    repeated = np.zeros(examples, dtype=bool)
+    repeated[1:] = sorted_hashes[1:] == sorted_hashes[:-1]
+    duplicates = np.sort(line_numbers[order][repeated])
+
+    over_context = []
+    context_len = _get(base_model_data, "supported_context_len")
+    if context_len:
+        over_context = line_numbers[token_lengths > context_len].tolist()
+
+    total_tokens = int(token_lengths.sum())
+    estimated_training_seconds = None
+    estimated_cost = None
+    training_time_per_log = _get(base_model_data, "training_time_per_log")
+    if training_time_per_log is not None:
+        estimated_training_seconds = float((_get(base_model_data, "training_time_y_intercept") or 0) + training_time_per_log * examples * epochs)
+    if cost_per_1000_tokens is not None:
+        estimated_cost = total_tokens * epochs / 1000 * cost_per_1000_tokens
+
+    return DatasetReport(file_path, examples, invalid_lines, total_tokens, token_percentiles, message_percentiles,
+                         (counts.tolist(), edges.tolist()), outliers.tolist(), duplicates.tolist(), over_context,
+                         estimated_training_seconds, estimated_cost)
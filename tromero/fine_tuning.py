@@ -1,13 +1,49 @@
 from .fine_tuning_requests import (get_signed_url, upload_file_to_url, save_logs, create_fine_tuning_job,
                                    get_model_training_info, get_models, deploy_model_request, get_model_request, undeploy_model_request, 
                                    get_tags, create_dataset, model_evaluation_request)
-from .tromero_utils import tags_to_string, validate_file_content
-from .fine_tuning_models import Model, TrainingMetrics, Dataset
+from .tromero_utils import tags_to_string, validate_file_content, file_content_error
+from .fine_tuning_models import Model, TrainingMetrics, Dataset, DatasetFileResult
+from .tromero_requests import TromeroError, get_model_url, probe_model, is_endpoint_failure
+from .dataset_analysis import analyze_file
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import os
+import time
 import uuid
 import json
 
 def set_raw(val, default):
     return val if val is not None else default
+
+def read_dataset_manifest(source, description="", tags=None):
+    """Lists the datasets to create from a directory (one dataset per .jsonl file, named after the file) or a
+    manifest, a .json list or .jsonl file of {"file", "name", "description", "tags"} entries. Only "file" is
+    required in a manifest, relative paths are relative to the manifest."""
+    if isinstance(tags, str):
+        tags = [tags]
+    tags = list(tags or [])
+    if os.path.isdir(source):
+        entries = [{"file": os.path.join(source, file_name)} for file_name in sorted(os.listdir(source))
+                   if file_name.endswith('.jsonl')]
+        base_directory = source
+    else:
+        with open(source, 'r') as f:
+            if source.endswith('.jsonl'):
+                entries = [json.loads(line) for line in f if line.strip()]
+            else:
+                entries = json.load(f)
+        base_directory = os.path.dirname(source)
+    datasets = []
+    for entry in entries:
+        file_path = os.path.join(base_directory, entry["file"])
+        entry_tags = entry.get("tags", tags)
+        datasets.append({
+            "file": file_path,
+            "name": entry.get("name") or os.path.splitext(os.path.basename(file_path))[0],
+            "description": entry.get("description", description),
+            "tags": [entry_tags] if isinstance(entry_tags, str) else list(entry_tags),
+        })
+    return datasets
     
 class Datasets:
     def __init__(self, tromero_key, raw_default=False):
@@ -29,9 +65,75 @@ class Datasets:
         create_dataset(name, description, [id_tag], self.tromero_key)
         return True
     
+    def create_many(self, source, description="", tags=None, max_workers=4, raw=None):
+        """Creates a dataset from every file of a directory or manifest (see read_dataset_manifest).
+        Up to max_workers files are processed at the same time, so one file is validated while others
+        upload. A file that fails does not stop the others, the result of every file is returned."""
+        raw = set_raw(raw, self.raw_default)
+        datasets = read_dataset_manifest(source, description, tags)
+        with ThreadPoolExecutor(max_workers=int(max_workers)) as executor:
+            results = list(executor.map(self._create_many_entry, datasets))
+        created = sum(result["status"] == "created" for result in results)
+        print(f"{created} of {len(results)} datasets created.")
+        if raw:
+            return results
+        return [DatasetFileResult(**result) for result in results]
+
+    def _create_many_entry(self, dataset):
+        # stage is the step that was running when the file failed
+        result = {"file": dataset["file"], "name": dataset["name"], "status": "failed", "stage": "validate",
+                  "error": None, "tags": None, "seconds": None}
+        start = time.monotonic()
+        id_tag = f"dataset_tag_{str(uuid.uuid4())}"
+        tags = dataset["tags"] + [id_tag]
+        try:
+            error = file_content_error(dataset["file"])
+            if error is not None:
+                result["status"] = "invalid"
+                result["error"] = error
+            else:
+                result["stage"] = "signed_url"
+                signed_url, filename = get_signed_url(self.tromero_key)
+                result["stage"] = "upload"
+                upload_file_to_url(signed_url, dataset["file"])
+                result["stage"] = "save_logs"
+                save_logs(filename, tags, self.tromero_key)
+                # the data is saved with these tags, a dataset can still be created from them if the next step fails
+                result["tags"] = tags
+                result["stage"] = "create_dataset"
+                create_dataset(dataset["name"], dataset["description"], [id_tag], self.tromero_key)
+                result["status"] = "created"
+                result["stage"] = None
+        except Exception as e:
+            result["error"] = str(e)
+        result["seconds"] = time.monotonic() - start
+        print(f"{dataset['file']}: {result['status']}" + (f" ({result['error']})" if result["error"] else ""))
+        return result
+
     def create_from_tags(self, name, description, tags):
         create_dataset(name, description, tags, self.tromero_key)
         return True
+
+    def analyze(self, file_path, base_model=None, epochs=1, cost_per_1000_tokens=None, raw=None):
+        """Reports length statistics, outliers and duplicates of a local jsonl file without uploading it.
+        With base_model (a base model name or one of your models) the training time is also estimated"""
+        raw = set_raw(raw, self.raw_default)
+        base_model_data = self._find_base_model_data(base_model) if base_model else None
+        report = analyze_file(file_path, base_model_data=base_model_data, epochs=int(epochs),
+                              cost_per_1000_tokens=cost_per_1000_tokens)
+        if raw:
+            return report.to_dict()
+        return report
+
+    def _find_base_model_data(self, base_model):
+        # the base model data (training time and context length) is only exposed on the models of the user
+        for model in get_models(self.tromero_key)["message"]:
+            base_model_data = model.get("base_model_data") or {}
+            names = (model.get("model_name"), base_model_data.get("model_name"), base_model_data.get("display_name"))
+            if base_model.lower() in [str(name).lower() for name in names if name]:
+                return base_model_data
+        print(f"No model found for base model {base_model}, the training time will not be estimated.")
+        return None
     
     def list(self, raw=None):
         raw = set_raw(raw, self.raw_default)
@@ -70,10 +172,16 @@ class FineTuningJob:
         return ret
 
     
+READY_STATES = ("deployed",)
+FAILED_STATES = ("failed",)
+
+
 class TromeroModels:
-    def __init__(self, tromero_key, raw_default=False):
+    def __init__(self, tromero_key, raw_default=False, on_model_ready=None):
         self.tromero_key = tromero_key
         self.raw_default = raw_default
+        # called with (model_name, url, base_model) when a model becomes ready, used by the client to warm its url cache
+        self.on_model_ready = on_model_ready
 
     def list(self, raw=None):
         """Returns a list of the users fine tuned models"""
@@ -103,6 +211,75 @@ class TromeroModels:
         response = undeploy_model_request(model_name, self.tromero_key)
         return response
 
+    def iter_ready(self, model_names, timeout=900, probe=False, location_preference=None,
+                   poll_interval=2, max_poll_interval=30, backoff=1.5):
+        """Waits for deployed models to be serving. Yields model names as each one becomes ready.
+
+        All models are tracked by a single scheduler: each one has its own next poll time and
+        its interval grows by `backoff` after every poll that is not ready yet. If `probe` is set
+        the resolved url is also sent a one token generation before the model counts as ready.
+        Server errors and network errors while polling count as not ready yet.
+        Raises TromeroError if a model fails, the api rejects the request (4xx) or the timeout is reached."""
+        if type(model_names) == str:
+            model_names = [model_names]
+        deadline = time.monotonic() + timeout
+        intervals = {}
+        queue = []
+        for model_name in model_names:
+            intervals[model_name] = poll_interval
+            heapq.heappush(queue, (time.monotonic(), model_name))
+
+        while queue:
+            due, model_name = heapq.heappop(queue)
+            now = time.monotonic()
+            if due > deadline:
+                pending = sorted([model_name] + [name for _, name in queue])
+                raise TromeroError(f"Timed out waiting for models to be ready: {pending}")
+            if due > now:
+                time.sleep(due - now)
+
+            if self._check_ready(model_name, probe, location_preference):
+                yield model_name
+                continue
+            heapq.heappush(queue, (time.monotonic() + intervals[model_name], model_name))
+            intervals[model_name] = min(intervals[model_name] * backoff, max_poll_interval)
+
+    def wait_until_ready(self, model_names, timeout=900, probe=False, location_preference=None, **kwargs):
+        """Blocks until all the models are serving. Returns the time in seconds each model took to be ready"""
+        start = time.monotonic()
+        ready = {}
+        for model_name in self.iter_ready(model_names, timeout=timeout, probe=probe,
+                                          location_preference=location_preference, **kwargs):
+            ready[model_name] = time.monotonic() - start
+        return ready
+
+    def _check_ready(self, model_name, probe, location_preference):
+        try:
+            response = get_model_request(model_name, self.tromero_key)
+        except TromeroError as e:
+            if not is_endpoint_failure(e):
+                raise
+            # the api was unreachable or failed, the model is polled again after the backoff
+            print(f"Error checking if model {model_name} is ready, retrying: {e}")
+            return False
+        state = response["message"].get("state")
+        if state in FAILED_STATES:
+            raise TromeroError(f"Model {model_name} is in state {state}")
+        if state not in READY_STATES:
+            return False
+        try:
+            url, base_model = get_model_url(model_name, self.tromero_key, location_preference)
+        except TromeroError:
+            # the model is marked as deployed before its url is registered
+            return False
+        if probe:
+            model_request_name = model_name if not base_model else "NO_ADAPTER"
+            if not probe_model(model_request_name, url, self.tromero_key):
+                return False
+        if self.on_model_ready:
+            self.on_model_ready(model_name, url, base_model)
+        return True
+
     
 class TromeroData:
     def __init__(self, tromero_key):
@@ -101,6 +101,16 @@ class Dataset:
         self.created_at = created_at
         self.updated_at = updated_at
 
+class DatasetFileResult:
+    def __init__(self, file, name, status, stage=None, error=None, tags=None, seconds=None):
+        self.file = file
+        self.name = name
+        self.status = status
+        self.stage = stage
+        self.error = error
+        self.tags = tags
+        self.seconds = seconds
+
 # {
 #   "evaluation": {
 #     "mix_eval": {
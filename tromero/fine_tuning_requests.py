@@ -1,7 +1,7 @@
 import requests
-import json
 from .constants import DATA_URL, BASE_URL
 from .tromero_requests import TromeroError, raise_for_status
+from . import json_codec
 
 
 def genric_request(method, path, data, tromero_key):
@@ -11,9 +11,9 @@ def genric_request(method, path, data, tromero_key):
         if method == "GET":
             response = requests.get(f"{BASE_URL}{path}", headers=headers)
         else :
-            response = requests.request(method, f"{BASE_URL}{path}", json=data, headers=headers)
+            response = requests.request(method, f"{BASE_URL}{path}", data=json_codec.dumps(data), headers=headers)
         raise_for_status(response)  # Raises HTTPError for bad responses (4XX, 5XX)
-        return response.json()  # Return the JSON response if request was successful
+        return json_codec.response_json(response)  # Return the JSON response if request was successful
     except TromeroError as e:
         raise e
     except Exception as e:
@@ -24,7 +24,7 @@ def exception_handler(func):
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            raise TromeroError(f'An error occurred: {e}')
+            raise TromeroError(f'An error occurred: {e}', status_code=getattr(e, "status_code", None))
     return wrapper
 
 @exception_handler
@@ -62,7 +62,7 @@ def get_models(tromero_key):
     }
     response = requests.get(f"{BASE_URL}/models?show_full=true", headers=headers)
     raise_for_status(response)  # Raises HTTPError for bad responses (4XX, 5XX)
-    return response.json()  # Return the JSON response if request was successful
+    return json_codec.response_json(response)  # Return the JSON response if request was successful
 
 @exception_handler
 def get_model_training_info(model_name, tromero_key):
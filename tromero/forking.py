@@ -0,0 +1,27 @@
+import os
+import weakref
+
+# Objects with an _after_fork_in_child method, reset in the child process after os.fork(), e.g. in
+# gunicorn preload workers. Locks held by other threads at fork time would never be released in the
+# child, background threads do not exist there and pooled sockets are shared with the parent.
+_objects = weakref.WeakSet()
+_callbacks = []
+
+
+def register(obj):
+    _objects.add(obj)
+
+
+def register_callback(callback):
+    _callbacks.append(callback)
+
+
+def _after_fork_in_child():
+    for callback in _callbacks:
+        callback()
+    for obj in list(_objects):
+        obj._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
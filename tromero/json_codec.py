@@ -0,0 +1,74 @@
+import json
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+class RawJson(bytes):
+    """Json already encoded to bytes, put into request bodies as is"""
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _load_backend(name):
+    if name == "orjson":
+        import orjson
+        return orjson.dumps, orjson.loads
+    if name == "msgspec":
+        import msgspec
+        return msgspec.json.Encoder().encode, msgspec.json.Decoder().decode
+    if name == "json":
+        return _json_dumps, json.loads
+    raise ValueError(f"Invalid json backend: {name}. Valid backends are {BACKENDS}")
+
+
+def use(name=None):
+    """Selects the json backend by name, or the fastest installed one: orjson, then msgspec, then the standard library"""
+    global backend, _dumps, _loads
+    for candidate in ([name] if name else BACKENDS):
+        try:
+            _dumps, _loads = _load_backend(candidate)
+        except ImportError:
+            if name:
+                raise
+            continue
+        backend = candidate
+        return backend
+
+
+def dumps(obj):
+    """Encodes obj to compact utf-8 json bytes"""
+    try:
+        return _dumps(obj)
+    except Exception:
+        # values the fast backends do not support, e.g. integers over 64 bits or non string keys
+        return _json_dumps(obj)
+
+
+def loads(data):
+    """Decodes json from bytes or str"""
+    return _loads(data)
+
+
+def encode_messages(messages):
+    """Encodes a messages list once, so it is not encoded again when the request is sent to another model"""
+    return RawJson(dumps(messages))
+
+
+def encode_generate_request(model, messages, parameters):
+    """Body of a /generate or /generate_stream request. messages can be a list or the result of encode_messages"""
+    if not isinstance(messages, RawJson):
+        messages = dumps(messages)
+    return b"".join((b'{"adapter_name":', dumps(model), b',"messages":', messages,
+                     b',"parameters":', dumps(parameters), b"}"))
+
+
+def response_json(response):
+    """Decodes the json body of a requests response"""
+    return _loads(response.content)
+
+
+backend = None
+_dumps = _loads = None
+use()
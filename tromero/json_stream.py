@@ -0,0 +1,140 @@
+import json
+
+_WHITESPACE = " \t\n\r"
+_SCALAR_CHARS = set("0123456789+-.eEtruefalsn")
+
+# what the parser accepts next
+_VALUE, _VALUE_OR_CLOSE, _KEY, _KEY_OR_CLOSE, _COLON, _COMMA_OR_CLOSE, _END = range(7)
+_VALUES = (_VALUE, _VALUE_OR_CLOSE)
+_KEYS = (_KEY, _KEY_OR_CLOSE)
+_EXPECTED_NAMES = {_VALUE: "a value", _VALUE_OR_CLOSE: "a value or ']'", _KEY: "a key", _KEY_OR_CLOSE: "a key or '}'",
+                   _COLON: "':'", _COMMA_OR_CLOSE: "',' or a closing bracket"}
+
+
+class IncrementalJsonParser:
+    """Parses a json document fed in pieces, e.g. the text deltas of a guided_schema stream.
+
+    Every character is looked at once, so feeding a whole stream costs the same as parsing the
+    final text once. feed() returns the (path, value) of each value that was completed by the
+    new text, where path is a tuple of object keys and array indexes. Containers are attached to
+    their parent as soon as they open, so `value` is always the partial document parsed so far."""
+    def __init__(self):
+        self.value = None
+        self.done = False
+        self._stack = []  # [container, pending key, path of the container] for each open object/array
+        self._expect = _VALUE
+        self._in_string = False
+        self._is_key = False
+        self._escape = False
+        self._token = []
+
+    def feed(self, text):
+        completed = []
+        for char in text:
+            if self._in_string:
+                self._read_string_char(char, completed)
+            elif char in _SCALAR_CHARS:
+                if not self._token:
+                    self._check_expected(char, _VALUES)
+                self._token.append(char)
+            else:
+                self._flush_scalar(completed)
+                self._read_structural_char(char, completed)
+        return completed
+
+    def close(self):
+        """Completes a trailing top level number or literal. Returns its (path, value) if there was one"""
+        completed = []
+        self._flush_scalar(completed)
+        return completed
+
+    def path(self):
+        if not self._stack:
+            return ()
+        container, key, path = self._stack[-1]
+        return path + (key if isinstance(container, dict) else len(container),)
+
+    def _check_expected(self, char, allowed):
+        if self._expect not in allowed:
+            if self._expect == _END:
+                raise ValueError(f"Unexpected {char!r} after the end of the json document")
+            raise ValueError(f"Unexpected {char!r} in json stream, expected {_EXPECTED_NAMES[self._expect]}")
+
+    def _read_string_char(self, char, completed):
+        self._token.append(char)
+        if self._escape:
+            self._escape = False
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            string = json.loads("".join(self._token))
+            self._token = []
+            if self._is_key:
+                self._stack[-1][1] = string
+                self._expect = _COLON
+            else:
+                self._add_value(string, completed)
+
+    def _read_structural_char(self, char, completed):
+        if char in _WHITESPACE:
+            return
+        if char == '"':
+            self._check_expected(char, _VALUES + _KEYS)
+            self._is_key = self._expect in _KEYS
+            self._in_string = True
+            self._token = ['"']
+        elif char == ":":
+            self._check_expected(char, (_COLON,))
+            self._expect = _VALUE
+        elif char == ",":
+            self._check_expected(char, (_COMMA_OR_CLOSE,))
+            self._expect = _KEY if isinstance(self._stack[-1][0], dict) else _VALUE
+        elif char in "{[":
+            self._check_expected(char, _VALUES)
+            container = {} if char == "{" else []
+            path = self.path()
+            self._attach(container)
+            self._stack.append([container, None, path])
+            self._expect = _KEY_OR_CLOSE if char == "{" else _VALUE_OR_CLOSE
+        elif char in "}]":
+            if char == "}":
+                self._check_expected(char, (_KEY_OR_CLOSE, _COMMA_OR_CLOSE))
+            else:
+                self._check_expected(char, (_VALUE_OR_CLOSE, _COMMA_OR_CLOSE))
+            if isinstance(self._stack[-1][0], dict) != (char == "}"):
+                raise ValueError(f"Unexpected {char!r} closing an {'object' if char == ']' else 'array'}")
+            container, _, path = self._stack.pop()
+            completed.append((path, container))
+            self._value_done()
+        else:
+            raise ValueError(f"Unexpected {char!r} in json stream")
+
+    def _flush_scalar(self, completed):
+        if not self._token or self._in_string:
+            return
+        token = "".join(self._token)
+        self._token = []
+        self._add_value(json.loads(token), completed)
+
+    def _attach(self, value):
+        if not self._stack:
+            self.value = value
+            return
+        container, key, _ = self._stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+
+    def _value_done(self):
+        if self._stack:
+            self._expect = _COMMA_OR_CLOSE
+        else:
+            self._expect = _END
+            self.done = True
+
+    def _add_value(self, value, completed):
+        completed.append((self.path(), value))
+        self._attach(value)
+        self._value_done()
@@ -0,0 +1,131 @@
+import threading
+import time
+
+STRATEGIES = ("ewma", "least_outstanding")
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.ewma_latency = 0.0  # whole response time of requests that are not streamed
+        self.ewma_ttft = 0.0  # time to the first chunk of streams
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def is_ejected(self, now):
+        return self.ejected_until > now
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "ewma_ttft": self.ewma_ttft,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected": self.is_ejected(time.monotonic()),
+        }
+
+
+class Lease:
+    """An endpoint acquired from a pool for one request. It is released once, by whichever of its
+    holders finishes first, e.g. the stream reading it or the stream being dropped unread"""
+    def __init__(self, pool, endpoint):
+        self.pool = pool
+        self.endpoint = endpoint
+        self.start = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self, latency=None, ok=True, ttft=None):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self.pool.release(self.endpoint, latency, ok, ttft)
+
+
+class EndpointPool:
+    """Replica urls of one model with client side balancing.
+
+    "ewma" picks the endpoint with the lowest latency EWMA weighted by its outstanding requests, so
+    the fastest replica gets most of the traffic. "least_outstanding" picks the endpoint with the
+    fewest requests in flight. Streams are compared by their time to the first chunk and other
+    requests by their whole response time, each kept in its own EWMA so the two never mix.
+    An endpoint is ejected for `ejection_time` seconds after `max_failures` consecutive failures;
+    if every endpoint is ejected they are all used anyway. Only failures of the endpoint count
+    (5xx, timeouts, broken connections), see is_endpoint_failure()."""
+    def __init__(self, urls, strategy="ewma", alpha=0.3, max_failures=3, ejection_time=30):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Invalid load balancing strategy: {strategy}. Valid strategies are {STRATEGIES}")
+        if not urls:
+            raise ValueError("An endpoint pool needs at least one url")
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(urls)]
+        self.strategy = strategy
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def _latency(self, endpoint, stream):
+        return endpoint.ewma_ttft if stream else endpoint.ewma_latency
+
+    def _cost(self, endpoint, stream, default_latency):
+        # an endpoint without a sample yet costs as much as an average one, not nothing
+        latency = self._latency(endpoint, stream) or default_latency
+        if self.strategy == "least_outstanding":
+            return (endpoint.outstanding, latency)
+        return (latency * (endpoint.outstanding + 1), endpoint.outstanding)
+
+    def acquire(self, stream=False):
+        """Picks an endpoint and counts a request in flight on it. Must be paired with release()"""
+        with self._lock:
+            now = time.monotonic()
+            healthy = [endpoint for endpoint in self.endpoints if not endpoint.is_ejected(now)]
+            sampled = [self._latency(endpoint, stream) for endpoint in self.endpoints if self._latency(endpoint, stream)]
+            default_latency = sum(sampled) / len(sampled) if sampled else 0.0
+            endpoint = min(healthy or self.endpoints, key=lambda endpoint: self._cost(endpoint, stream, default_latency))
+            endpoint.outstanding += 1
+            return endpoint
+
+    def lease(self, stream=False):
+        """Acquires an endpoint as a Lease, to release it from wherever the request ends"""
+        return Lease(self, self.acquire(stream))
+
+    def _ewma(self, current, sample):
+        return self.alpha * sample + (1 - self.alpha) * current if current else sample
+
+    def release(self, endpoint, latency=None, ok=True, ttft=None):
+        """Ends a request. latency is the whole response time of a request that was not streamed,
+        ttft the time to the first chunk of a stream, None when the request gave no sample"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                if latency is not None:
+                    endpoint.ewma_latency = self._ewma(endpoint.ewma_latency, latency)
+                if ttft is not None:
+                    endpoint.ewma_ttft = self._ewma(endpoint.ewma_ttft, ttft)
+            else:
+                endpoint.failures += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.max_failures:
+                    endpoint.ejected_until = time.monotonic() + self.ejection_time
+                    endpoint.consecutive_failures = 0
+
+    def stats(self):
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def _after_fork_in_child(self):
+        self._lock = threading.Lock()
+        for endpoint in self.endpoints:
+            endpoint.outstanding = 0
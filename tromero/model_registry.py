@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+from .load_balancer import EndpointPool
+from . import forking
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ModelRegistry:
+    """Per model state of a client: the endpoint pool of its replica urls and whether the model is a base model.
+
+    Thread safety: reads never take a lock, entries are tuples that are replaced and never
+    mutated. Writes and resolutions take one of `stripes` locks chosen by model name, so threads
+    resolving the same model wait for the first resolution instead of repeating it, while
+    different models resolve in parallel."""
+    def __init__(self, stripes=16, strategy="ewma"):
+        self.strategy = strategy
+        self._entries = {}
+        self._base_model_flags = {}  # is_base_model set before the model had urls
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        forking.register(self)
+
+    def _after_fork_in_child(self):
+        self._locks = [threading.Lock() for _ in self._locks]
+        for pool, _ in list(self._entries.values()):
+            pool._after_fork_in_child()
+
+    def _lock_for(self, model_name):
+        return self._locks[hash(model_name) % len(self._locks)]
+
+    def get(self, model_name):
+        """Returns (endpoint pool, is_base_model) or None if the model has not been resolved"""
+        return self._entries.get(model_name)
+
+    def set(self, model_name, urls, is_base_model=None):
+        """Sets the urls of the model. is_base_model None keeps the model's current value, False for a new model"""
+        if type(urls) == str:
+            urls = [urls]
+        with self._lock_for(model_name):
+            if is_base_model is None:
+                entry = self._entries.get(model_name)
+                is_base_model = entry[1] if entry is not None else self._base_model_flags.get(model_name, False)
+            self._base_model_flags.pop(model_name, None)
+            self._entries[model_name] = (EndpointPool(urls, strategy=self.strategy), is_base_model)
+
+    def set_base_model(self, model_name, is_base_model):
+        """Sets whether the model is a base model, keeping its endpoints and their stats"""
+        with self._lock_for(model_name):
+            entry = self._entries.get(model_name)
+            if entry is None:
+                self._base_model_flags[model_name] = is_base_model
+            else:
+                self._entries[model_name] = (entry[0], is_base_model)
+
+    def resolve(self, model_name, resolver):
+        """Returns (endpoint pool, is_base_model), calling resolver(model_name) for the list of urls
+        only if no other thread has resolved it"""
+        entry = self._entries.get(model_name)
+        if entry is not None:
+            return entry
+        with self._lock_for(model_name):
+            entry = self._entries.get(model_name)
+            if entry is None:
+                urls, is_base_model = resolver(model_name)
+                entry = (EndpointPool(urls, strategy=self.strategy), is_base_model)
+                self._entries[model_name] = entry
+        return entry
+
+    def remove(self, model_name):
+        with self._lock_for(model_name):
+            self._entries.pop(model_name, None)
+            self._base_model_flags.pop(model_name, None)
+
+    def urls(self):
+        """The first url of each model"""
+        return {model_name: entry[0].urls[0] for model_name, entry in list(self._entries.items())}
+
+    def stats(self):
+        return {model_name: entry[0].stats() for model_name, entry in list(self._entries.items())}
+
+    def base_models(self):
+        return {model_name: entry[1] for model_name, entry in list(self._entries.items())}
+
+    def __contains__(self, model_name):
+        return model_name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ModelUrls(MutableMapping):
+    """The first url of each model, as a dict that writes through to the registry.
+    Setting a url replaces the model's endpoints, deleting it forgets the model"""
+    def __init__(self, registry):
+        self._registry = registry
+
+    def __getitem__(self, model_name):
+        entry = self._registry.get(model_name)
+        if entry is None:
+            raise KeyError(model_name)
+        return entry[0].urls[0]
+
+    def __setitem__(self, model_name, url):
+        self._registry.set(model_name, url)
+
+    def __delitem__(self, model_name):
+        if model_name not in self._registry:
+            raise KeyError(model_name)
+        self._registry.remove(model_name)
+
+    def __iter__(self):
+        return iter(self._registry.urls())
+
+    def __len__(self):
+        return len(self._registry)
+
+    def __repr__(self):
+        return repr(self._registry.urls())
+
+
+class BaseModels(ModelUrls):
+    """Whether each model is a base model, as a dict that writes through to the registry.
+    Deleting a model forgets it, like deleting its url"""
+    def __getitem__(self, model_name):
+        entry = self._registry.get(model_name)
+        if entry is None:
+            raise KeyError(model_name)
+        return entry[1]
+
+    def __setitem__(self, model_name, is_base_model):
+        self._registry.set_base_model(model_name, is_base_model)
+
+    def __repr__(self):
+        return repr(self._registry.base_models())
+
+
+class FileUrlCache:
+    """Resolved model urls shared between processes through a json file, so forked workers
+    do not each resolve every model. Entries expire after ttl seconds."""
+    def __init__(self, path, ttl=300):
+        self.path = path
+        self.ttl = ttl
+
+    def _locked(self, exclusive):
+        lock_file = open(self.path + ".lock", "a")
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        return lock_file
+
+    def _read(self):
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        """Returns (urls, is_base_model) or None if the key is missing or expired"""
+        with self._locked(exclusive=False):
+            entry = self._read().get(key)
+        if entry is None or time.time() - entry["time"] > self.ttl:
+            return None
+        return entry["urls"], entry["is_base_model"]
+
+    def set(self, key, urls, is_base_model):
+        with self._locked(exclusive=True):
+            entries = self._read()
+            entries[key] = {"urls": list(urls), "is_base_model": is_base_model, "time": time.time()}
+            temporary_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(entries, file)
+            os.replace(temporary_path, self.path)
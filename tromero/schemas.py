@@ -0,0 +1,99 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from .tromero_requests import TromeroError
+from . import forking
+
+VALID_PROPERTY_TYPES = {"string", "number", "integer", "boolean", "array", "object"}
+
+
+class SchemaValidationError(TromeroError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def canonicalize_schema(schema):
+    """Returns the schema as a canonical json string and its sha256 hash, so equal schemas share a cache entry"""
+    if isinstance(schema, (str, bytes)):
+        schema = json.loads(schema)
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return canonical, hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def check_schema(schema):
+    """Checks the schema against JSON Schema Draft 7 and the properties rules used for guided_schema"""
+    from jsonschema import Draft7Validator
+    from jsonschema.exceptions import SchemaError
+    try:
+        Draft7Validator.check_schema(schema)
+        if "properties" in schema:
+            for prop, details in schema["properties"].items():
+                if "type" in details:
+                    if details["type"] not in VALID_PROPERTY_TYPES:
+                        raise ValueError(f"Invalid type specified: {details['type']} in property '{prop}'")
+                else:
+                    raise ValueError(f"No type specified for property '{prop}'")
+        else:
+            raise ValueError("No properties defined in the schema.")
+    except (SchemaError, ValueError) as e:
+        raise SchemaError(f"Schema validation failed: {e}")
+
+
+class SchemaRegistry:
+    """Caches checked and compiled validators by schema hash, evicting the least recently used.
+    Safe to share between threads."""
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._validators = OrderedDict()
+        self._lock = threading.Lock()
+        forking.register(self)
+
+    def _after_fork_in_child(self):
+        self._lock = threading.Lock()
+
+    def get_validator(self, schema):
+        """Returns the compiled validator for the schema, checking and compiling it only the first time it is seen"""
+        canonical, key = canonicalize_schema(schema)
+        with self._lock:
+            validator = self._validators.get(key)
+            if validator is not None:
+                self._validators.move_to_end(key)
+                return validator
+        from jsonschema import Draft7Validator
+        schema = json.loads(canonical)
+        check_schema(schema)
+        validator = Draft7Validator(schema)
+        with self._lock:
+            self._validators[key] = validator
+            self._validators.move_to_end(key)
+            while len(self._validators) > self.max_size:
+                self._validators.popitem(last=False)
+        return validator
+
+    def validate(self, schema, instance):
+        """Raises SchemaValidationError if instance does not match the schema"""
+        errors = sorted(self.get_validator(schema).iter_errors(instance), key=lambda e: list(e.path))
+        if errors:
+            error = errors[0]
+            path = "/".join(str(p) for p in error.path)
+            raise SchemaValidationError(f"Output does not match guided_schema at '{path}': {error.message}")
+
+    def validate_json(self, schema, text):
+        """Parses the generated text and validates it against the schema. Returns the parsed object"""
+        try:
+            instance = json.loads(text)
+        except (TypeError, ValueError) as e:
+            raise SchemaValidationError(f"Output is not valid json: {e}")
+        self.validate(schema, instance)
+        return instance
+
+    def clear(self):
+        with self._lock:
+            self._validators.clear()
+
+    def __len__(self):
+        return len(self._validators)
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,57 @@
+import time
+
+DEFAULT_INTERVAL = 0.02
+DEFAULT_MAX_BYTES = 256
+# end of sequence marker some models send as a chunk of its own, consumers drop it by comparing whole chunks
+END_OF_SEQUENCE = "</s>"
+
+
+def batching_options(stream_batching):
+    """Returns (interval, max_bytes) for a stream_batching setting: True for the defaults, or a dict
+    with "interval" (seconds) and/or "max_bytes". Returns None if batching is off."""
+    if not stream_batching:
+        return None
+    if stream_batching is True:
+        stream_batching = {}
+    return stream_batching.get("interval", DEFAULT_INTERVAL), stream_batching.get("max_bytes", DEFAULT_MAX_BYTES)
+
+
+def _emit(chunk, texts, parsed_fields):
+    # the last chunk of the batch is reused so openai chunks keep their fields (id, finish_reason...)
+    chunk.choices[0].delta.content = "".join(texts)
+    if parsed_fields is not None:
+        chunk.parsed_fields = parsed_fields
+    return chunk
+
+
+def batch_chunks(chunks, interval=DEFAULT_INTERVAL, max_bytes=DEFAULT_MAX_BYTES):
+    """Groups the chunks of a stream, emitting a batch once `interval` seconds have passed since the last
+    one or it holds `max_bytes` of text. The first chunk, and the first chunk after a fallback restart,
+    are yielded immediately. The end of sequence marker flushes the batch and stays a chunk of its own. Batches are checked as chunks arrive, so a batch can be held past the
+    interval until the next token comes in."""
+    last_emit = None
+    texts = []
+    size = 0
+    parsed_fields = None
+    last_chunk = None
+    for chunk in chunks:
+        if last_emit is None or getattr(chunk, "restarted", False) or chunk.choices[0].delta.content == END_OF_SEQUENCE:
+            if texts:
+                yield _emit(last_chunk, texts, parsed_fields)
+                texts, size, parsed_fields = [], 0, None
+            last_emit = time.monotonic()
+            yield chunk
+            continue
+        content = chunk.choices[0].delta.content or ""
+        texts.append(content)
+        size += len(content.encode("utf-8"))
+        if hasattr(chunk, "parsed_fields"):
+            parsed_fields = (parsed_fields or []) + chunk.parsed_fields
+        last_chunk = chunk
+        now = time.monotonic()
+        if size >= max_bytes or now - last_emit >= interval:
+            yield _emit(chunk, texts, parsed_fields)
+            texts, size, parsed_fields = [], 0, None
+            last_emit = now
+    if texts:
+        yield _emit(last_chunk, texts, parsed_fields)
@@ -0,0 +1,113 @@
+import math
+import re
+import threading
+from .tromero_requests import TromeroError
+from . import forking
+
+# tokens added by chat templates around every message and to prime the reply
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 2
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class PromptTooLongError(TromeroError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class HeuristicTokenizer:
+    """Estimates token counts without a vocabulary, slightly over counting for typical text"""
+    def count(self, text):
+        if not text:
+            return 0
+        return max(math.ceil(len(text.encode("utf-8")) / 4), len(_WORD_RE.findall(text)))
+
+
+class HuggingFaceTokenizer:
+    """Counts tokens with the tokenizer of a Hugging Face repo. Needs the optional `tokenizers` package"""
+    def __init__(self, hf_repo):
+        from tokenizers import Tokenizer
+        self.hf_repo = hf_repo
+        self._tokenizer = Tokenizer.from_pretrained(hf_repo)
+
+    def count(self, text):
+        if not text:
+            return 0
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+heuristic_tokenizer = HeuristicTokenizer()
+_tokenizers = {}
+_tokenizers_lock = threading.Lock()
+
+
+def _reset_tokenizers_lock():
+    global _tokenizers_lock
+    _tokenizers_lock = threading.Lock()
+
+forking.register_callback(_reset_tokenizers_lock)
+
+
+def register_tokenizer(base_model, tokenizer):
+    """Uses tokenizer, any object with a count(text) method, for the models trained on base_model"""
+    with _tokenizers_lock:
+        _tokenizers[base_model] = tokenizer
+
+
+def get_tokenizer(base_model=None, hf_repo=None):
+    """Returns the registered tokenizer of the base model, loading (and caching) its Hugging Face
+    vocabulary when possible and falling back to the heuristic estimate"""
+    key = base_model or hf_repo
+    if key is None:
+        return heuristic_tokenizer
+    tokenizer = _tokenizers.get(key)
+    if tokenizer is not None:
+        return tokenizer
+    with _tokenizers_lock:
+        tokenizer = _tokenizers.get(key)
+        if tokenizer is None:
+            tokenizer = heuristic_tokenizer
+            if hf_repo:
+                try:
+                    tokenizer = HuggingFaceTokenizer(hf_repo)
+                except Exception:
+                    # tokenizers is not installed or the vocabulary can not be downloaded
+                    pass
+            _tokenizers[key] = tokenizer
+    return tokenizer
+
+
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return "" if content is None else str(content)
+
+
+def count_message_tokens(messages, tokenizer=heuristic_tokenizer):
+    """Token count of a chat prompt, including the chat template overhead"""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += TOKENS_PER_MESSAGE + tokenizer.count(_content_text(message.get("content")))
+    return total
+
+
+def truncate_messages(messages, max_tokens, tokenizer=heuristic_tokenizer):
+    """Drops the oldest turns after the system prompt until the prompt fits in max_tokens.
+    The system prompt and the last message are always kept. Returns the kept messages and their token count."""
+    counts = [TOKENS_PER_MESSAGE + tokenizer.count(_content_text(message.get("content"))) for message in messages]
+    total = TOKENS_PER_REPLY + sum(counts)
+    first = 0
+    while first < len(messages) and messages[first].get("role") == "system":
+        first += 1
+    start = first
+    # drop a whole user/assistant exchange at a time so the kept turns still alternate
+    while total > max_tokens and start < len(messages) - 1:
+        step = 2 if start + 2 < len(messages) else 1
+        total -= sum(counts[start:start + step])
+        start += step
+    if total > max_tokens:
+        raise PromptTooLongError(f"The prompt is about {total} tokens, more than the {max_tokens} tokens available even after truncation.")
+    return messages[:first] + messages[start:], total
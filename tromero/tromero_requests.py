@@ -1,19 +1,38 @@
 import requests
-import json
 from .tromero_utils import mock_openai_format_stream
 from .constants import DATA_URL, BASE_URL
+from . import forking
+from . import json_codec
 import traceback
 
+_session = None
+
+def get_session():
+    """Returns the shared session so requests to the same model reuse pooled connections"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+def _reset_session():
+    # the pooled connections are shared with the parent process after a fork, the child opens its own
+    global _session
+    _session = None
+
+forking.register_callback(_reset_session)
+
 class TromeroError(Exception):
-    def __init__(self, message):
+    def __init__(self, message, status_code=None):
         super().__init__(message)
+        # http status of the failed response, None when no response was received
+        self.status_code = status_code
 
 def raise_for_status(response):
     # if status code does not start with 2, raise an error
     if not str(response.status_code).startswith('2'):
-        json_response = response.json()
+        json_response = json_codec.response_json(response)
         message = json_response.get('message', json_response.get('error', 'An error occurred'))
-        raise TromeroError(f"\033[95m{message}\033[0m")
+        raise TromeroError(f"\033[95m{message}\033[0m", status_code=response.status_code)
 
 
 def post_data(data, auth_token):
@@ -22,26 +41,23 @@ def post_data(data, auth_token):
         'Content-Type': 'application/json'
     }
     try:
-        response = requests.post(DATA_URL, json=data, headers=headers)
+        response = requests.post(DATA_URL, data=json_codec.dumps(data), headers=headers)
         raise_for_status(response)  # Raises HTTPError for bad responses (4XX, 5XX)
-        return response.json()  # Return the JSON response if request was successful
+        return json_codec.response_json(response)  # Return the JSON response if request was successful
     except TromeroError as e:
         raise e
     except Exception as e:
         raise TromeroError(f'An error occurred: {e}')
     
 def tromero_model_create(model, model_url, messages, tromero_key, parameters={}):
+    """messages can be a list or already encoded with json_codec.encode_messages"""
     try:
         headers = {'Content-Type': 'application/json'}
-        data = {
-            "adapter_name": model,
-            "messages": messages,
-            "parameters": parameters
-        }
+        data = json_codec.encode_generate_request(model, messages, parameters)
         headers['X-API-KEY'] = tromero_key
-        response = requests.post(f"{model_url}/generate", json=data, headers=headers)
+        response = get_session().post(f"{model_url}/generate", data=data, headers=headers)
         raise_for_status(response)  # Raises HTTPError for bad responses (4XX, 5XX)
-        return response.json()  # Return the JSON response if request was successful
+        return json_codec.response_json(response)  # Return the JSON response if request was successful
     except TromeroError as e:
         raise e
     except Exception as e:
@@ -49,7 +65,6 @@ def tromero_model_create(model, model_url, messages, tromero_key, parameters={})
     
 
 def get_model_url(model_name, auth_token, location_preference):
-    print(f"location_preference: {location_preference.lower()}")
     headers = {
         'X-API-KEY': auth_token,
         'Content-Type': 'application/json'
@@ -59,43 +74,108 @@ def get_model_url(model_name, auth_token, location_preference):
     else:
         url = f"{BASE_URL}/model/{model_name}/url"
     try:
-        response = requests.get(url, headers=headers)
+        response = get_session().get(url, headers=headers)
         raise_for_status(response)  # Raises HTTPError for bad responses (4XX, 5XX)
-        return response.json()['url'], response.json().get('base_model', False)  # Return the JSON response if request was successful
+        json_response = json_codec.response_json(response)
+        return json_response['url'], json_response.get('base_model', False)  # Return the JSON response if request was successful
     except TromeroError as e:
         raise e
     except Exception as e:
         raise TromeroError(f'An error occurred: {e}')
     
+def get_model_urls(model_name, auth_token, location_preference):
+    """Returns the replica urls of the model and if it is a base model.
+    location_preference can be a list of regions, the urls of every region are returned in that order."""
+    if not isinstance(location_preference, (list, tuple)):
+        location_preference = [location_preference]
+    urls = []
+    base_model = False
+    errors = []
+    for location in location_preference:
+        try:
+            url, base_model = get_model_url(model_name, auth_token, location)
+        except TromeroError as e:
+            # the model may not be deployed in every region
+            errors.append(e)
+            continue
+        urls.append(url)
+    if not urls:
+        raise errors[0]
+    return urls, base_model
+
+def probe_model(model, model_url, tromero_key, timeout=10):
+    """Sends a one token generation to the model url. Returns True if the model answered."""
+    headers = {'Content-Type': 'application/json', 'X-API-KEY': tromero_key}
+    data = json_codec.encode_generate_request(model, [{"role": "user", "content": "hi"}], {"max_new_tokens": 1})
+    try:
+        response = get_session().post(f"{model_url}/generate", data=data, headers=headers, timeout=timeout)
+    except Exception:
+        return False
+    return str(response.status_code).startswith('2')
+
+def open_connection(model_url, timeout=10):
+    """Opens a pooled connection to the model server (DNS and TLS) without generating anything"""
+    try:
+        get_session().head(model_url, timeout=timeout)
+    except Exception as e:
+        raise TromeroError(f'An error occurred: {e}')
+
+class StreamError(TromeroError):
+    def __init__(self, message, status_code=None):
+        super().__init__(message, status_code=status_code)
+
+
+def is_endpoint_failure(error):
+    """True if the error is the server's fault and may pass on a retry: a 5xx, a timeout or a broken connection.
+    Rejected requests (4xx) say nothing about the health of the endpoint"""
+    return error.status_code is None or error.status_code >= 500
+
 class StreamResponse:
+    """Iterates the events of a /generate_stream response as openai style chunks.
+    Raises StreamError if the stream stalls, the connection breaks or an event is malformed."""
     def __init__(self, response):
         self.response = response
 
+    def close(self):
+        self.response.close()
+
     def __iter__(self):
         try:
-            last_chunk = None
+            # an event can be split across network reads, the incomplete last line waits for the next read
+            tail = b''
             for chunk in self.response.iter_content(chunk_size=10000000):
-                # chunk_dict = json.loads(chunk)
-                chunk = chunk.decode('utf-8')
-                json_str = chunk[5:]
-                last_chunk = json_str
-                chunk_dict = json.loads(json_str)
-                formatted_chunk = mock_openai_format_stream(chunk_dict['token']['text'])
-                yield formatted_chunk
+                lines = (tail + chunk).split(b'\n')
+                tail = lines.pop()
+                for event in lines:
+                    parsed = self._parse_event(event)
+                    if parsed is not None:
+                        yield parsed
+            parsed = self._parse_event(tail)
+            if parsed is not None:
+                yield parsed
         except Exception as e:
-            print(f"Error: {e}")
-            return
+            raise StreamError(f'Stream interrupted: {e}')
+
+    def _parse_event(self, event):
+        event = event.strip()
+        # blank lines separate events and lines starting with ':' are keep-alive comments
+        if not event or event.startswith(b':'):
+            return None
+        chunk_dict = json_codec.loads(event[5:])
+        return mock_openai_format_stream(chunk_dict['token']['text'])
     
-def tromero_model_create_stream(model, model_url, messages, tromero_key, parameters={}):
+def tromero_model_create_stream(model, model_url, messages, tromero_key, parameters={}, timeout=None):
+    """Opens a stream. Returns (StreamResponse, None), or (None, error) if the server answered with an error.
+    timeout is the longest wait in seconds for the next event before the stream counts as stalled.
+    messages can be a list or already encoded with json_codec.encode_messages."""
     headers = {'Content-Type': 'application/json'}
-    data = {
-        "adapter_name": model,
-        "messages": messages,
-        "parameters": parameters
-    }
+    data = json_codec.encode_generate_request(model, messages, parameters)
     headers['X-API-KEY'] = tromero_key
     try:
-        response = requests.post(model_url + "/generate_stream", json=data, headers=headers, stream=True)
+        response = get_session().post(model_url + "/generate_stream", data=data, headers=headers, stream=True, timeout=timeout)
+        if not str(response.status_code).startswith('2'):
+            return None, StreamError(f"Stream request failed with status {response.status_code}: {response.text[:500]}",
+                                     status_code=response.status_code)
         return StreamResponse(response), None
     except TromeroError as e:
         raise e
@@ -0,0 +1,194 @@
+import datetime
+import threading
+from .tromero_requests import TromeroError
+from . import forking
+from . import json_codec
+
+GROUPS = ("model", "tag", "fallback")
+FIELDS = ("requests", "prompt_tokens", "completion_tokens", "latency")
+
+
+class BudgetExceededError(TromeroError):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class Budget:
+    def __init__(self, max_tokens, downgrade_model=None):
+        self.max_tokens = max_tokens
+        self.downgrade_model = downgrade_model
+        self.used_tokens = 0
+
+    def stats(self):
+        return {"max_tokens": self.max_tokens, "used_tokens": self.used_tokens, "downgrade_model": self.downgrade_model}
+
+
+def _add(totals, counters):
+    # list() copies the items without running python code, so a thread adding a key can not break it
+    for key, values in list(counters.items()):
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                total[i] += value
+
+
+class UsageTracker:
+    """Counts requests, prompt and completion tokens and latency (seconds) by model, tag and whether the
+    fallback model answered. A request with several tags is counted under each of them.
+
+    Every thread adds to its own counters, so recording takes no lock. snapshot() sums them, a request
+    being recorded at that moment may be partly counted. Budgets limit the tokens used by a tag: once
+    a budget is used up, requests with the tag are sent to its downgrade model, or fail with
+    BudgetExceededError if it has none. Requests already in flight can go over the budget.
+    Counts and budgets are per process, a forked child starts from zero."""
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._budgets = {}
+        self._lock = threading.Lock()
+        self._export_stop = None
+        self._export_args = None
+        forking.register(self)
+
+    def _after_fork_in_child(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        for budget in self._budgets.values():
+            budget.used_tokens = 0
+        # the export thread belongs to the parent
+        self._export_stop = None
+        if self._export_args is not None:
+            self.export_every(*self._export_args)
+
+    def _counters(self):
+        counters = getattr(self._local, "counters", None)
+        if counters is None:
+            counters = self._local.counters = {}
+            with self._lock:
+                # merging finished threads here keeps a thread per request server from piling up counters
+                self._merge_finished()
+                self._shards.append((threading.current_thread(), counters))
+        return counters
+
+    def _merge_finished(self):
+        # the counters of finished threads can not change anymore, they are merged once. Needs the lock
+        shards = []
+        for thread, counters in self._shards:
+            if thread.is_alive():
+                shards.append((thread, counters))
+            else:
+                _add(self._retired, counters)
+        self._shards = shards
+        return shards
+
+    def record(self, model, tags, prompt_tokens, completion_tokens, latency, fallback=False):
+        counters = self._counters()
+        prompt_tokens = prompt_tokens or 0
+        completion_tokens = completion_tokens or 0
+        for tag in tags or [None]:
+            values = counters.get((model, tag, fallback))
+            if values is None:
+                values = counters[(model, tag, fallback)] = [0, 0, 0, 0.0]
+            values[0] += 1
+            values[1] += prompt_tokens
+            values[2] += completion_tokens
+            values[3] += latency
+        if self._budgets and tags:
+            with self._lock:
+                for tag in tags:
+                    budget = self._budgets.get(tag)
+                    if budget is not None:
+                        budget.used_tokens += prompt_tokens + completion_tokens
+
+    def snapshot(self, by=GROUPS):
+        """Returns the totals grouped by the fields in `by`, a list of dicts with those fields and
+        requests, prompt_tokens, completion_tokens and latency"""
+        for group in by:
+            if group not in GROUPS:
+                raise ValueError(f"Invalid usage group: {group}. Valid groups are {GROUPS}")
+        with self._lock:
+            shards = self._merge_finished()
+            totals = {key: list(values) for key, values in self._retired.items()}
+        for _, counters in shards:
+            _add(totals, counters)
+        grouped = {}
+        for key, values in totals.items():
+            group_key = tuple(key[GROUPS.index(group)] for group in by)
+            _add(grouped, {group_key: values})
+        return [dict(zip(by, key), **dict(zip(FIELDS, values))) for key, values in grouped.items()]
+
+    def reset(self):
+        with self._lock:
+            self._retired = {}
+            for _, counters in self._shards:
+                counters.clear()
+            for budget in self._budgets.values():
+                budget.used_tokens = 0
+
+    def set_budget(self, tag, max_tokens, downgrade_model=None):
+        """Limits the prompt and completion tokens of the requests tagged with tag"""
+        with self._lock:
+            budget = Budget(max_tokens, downgrade_model)
+            if tag in self._budgets:
+                budget.used_tokens = self._budgets[tag].used_tokens
+            self._budgets[tag] = budget
+
+    def remove_budget(self, tag):
+        with self._lock:
+            self._budgets.pop(tag, None)
+
+    def budgets(self):
+        with self._lock:
+            return {tag: budget.stats() for tag, budget in self._budgets.items()}
+
+    def has_budget(self, tags):
+        return bool(self._budgets) and any(tag in self._budgets for tag in tags or ())
+
+    def budget_model(self, model, tags):
+        """Returns the model to send a request with these tags to. Raises BudgetExceededError if a
+        budget of the tags is used up and has no downgrade model"""
+        if not self._budgets:
+            return model
+        for tag in tags or ():
+            budget = self._budgets.get(tag)
+            if budget is not None and budget.used_tokens >= budget.max_tokens:
+                if budget.downgrade_model is None:
+                    raise BudgetExceededError(f"The token budget of tag '{tag}' is used up: {budget.used_tokens} of {budget.max_tokens} tokens.")
+                model = budget.downgrade_model
+        return model
+
+    def export_every(self, interval, sink):
+        """Exports a snapshot every interval seconds from a background thread. sink is called with
+        the snapshot, or if it is a file path the snapshot is appended to it as a json line"""
+        self.stop_export()
+        self._export_args = (interval, sink)
+        self._export_stop = threading.Event()
+        threading.Thread(target=self._export, args=(interval, sink, self._export_stop),
+                         name="tromero-usage-export", daemon=True).start()
+
+    def stop_export(self):
+        self._export_args = None
+        if self._export_stop is not None:
+            self._export_stop.set()
+            self._export_stop = None
+
+    def _export(self, interval, sink, stop):
+        while not stop.wait(interval):
+            try:
+                self.export(sink)
+            except Exception as e:
+                print(f"Error exporting usage: {e}")
+
+    def export(self, sink):
+        snapshot = self.snapshot()
+        if callable(sink):
+            sink(snapshot)
+            return
+        line = json_codec.dumps({"time": datetime.datetime.now().isoformat(), "usage": snapshot})
+        with open(sink, "ab") as f:
+            f.write(line + b"\n")
@@ -5,17 +5,61 @@ from openai.resources.chat.completions import (
     Completions
 )
 from openai._compat import cached_property
+from openai._base_client import SyncHttpxClientWrapper
 import datetime
-from tromero.tromero_requests import post_data, tromero_model_create, get_model_url, tromero_model_create_stream
+import hashlib
+from tromero.tromero_requests import (TromeroError, StreamError, post_data, tromero_model_create, get_model_urls, tromero_model_create_stream,
+                                      open_connection, probe_model, is_endpoint_failure)
 from tromero.tromero_utils import mock_openai_format, tags_to_string
 import warnings
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from tromero.fine_tuning import TromeroModels, TromeroData, FineTuningJob, Datasets
-from jsonschema import Draft7Validator
-from jsonschema.exceptions import SchemaError
-# import check_schema
-from jsonschema import Validator, FormatChecker
-from jsonschema import Draft7Validator
+from tromero.schemas import schema_registry
+from tromero.json_stream import IncrementalJsonParser
+from tromero.model_registry import ModelRegistry, FileUrlCache, ModelUrls, BaseModels
+from tromero.coalescing import SingleFlight, is_deterministic, request_key
+from tromero.tokens import PromptTooLongError, count_message_tokens, get_tokenizer, truncate_messages
+from tromero.fine_tuning_requests import get_model_request
+from tromero.data_sink import LocalDataSink
+from tromero.stream_batching import batch_chunks, batching_options
+from tromero.json_codec import encode_messages
+from tromero.usage import UsageTracker
+from tromero import forking
+
+# create() arguments used by the client, not sent to the model
+EXTRA_CREATE_KWARGS = ('tags', 'use_fallback', 'fallback_model', 'save_data', 'validate_output', 'parse_json', 'coalesce',
+                       'auto_truncate', 'stream_batching', '_encoded_messages', '_fallback')
+# seconds before the model info is requested again after the api failed to answer
+MODEL_CONTEXT_RETRY_SECONDS = 30
+
+
+class ModelStream:
+    """The chunks of a stream from a Tromero model. The endpoint is released and the connection closed
+    when the stream ends, is closed, or is dropped, also if it was never read"""
+    def __init__(self, chunks, lease, response):
+        self._chunks = chunks
+        self._lease = lease
+        self._response = response
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._chunks)
+
+    def close(self):
+        # a stream that was read finishes in its generator, an unread one only has the lease to release
+        self._chunks.close()
+        self._lease.release()
+        response, self._response = self._response, None
+        close = getattr(response, "close", None)
+        if close is not None:
+            close()
+
+    def __del__(self):
+        self.close()
 
 
 class MockCompletions(Completions):
@@ -32,28 +76,15 @@ class MockCompletions(Completions):
     
     def _save_data(self, data, save_data=True):
         if save_data:
-            threading.Thread(target=post_data, args=(data, self._client.tromero_key)).start()
-
-    def validate_schema(self, schema):
-        try:
-        # Validate schema against the JSON Schema Draft 7
-            Draft7Validator.check_schema(schema)
-
-            # Additional common checks
-            if "properties" in schema:
-                for prop, details in schema["properties"].items():
-                    if "type" in details:
-                        valid_types = {"string", "number", "integer", "boolean", "array", "object"}
-                        if details["type"] not in valid_types:
-                            raise ValueError(f"Invalid type specified: {details['type']} in property '{prop}'")
-                    else:
-                        raise ValueError(f"No type specified for property '{prop}'")
+            if self._client.data_sink is not None:
+                self._client.data_sink.write(data)
             else:
-                raise ValueError("No properties defined in the schema.")
+                threading.Thread(target=post_data, args=(data, self._client.tromero_key)).start()
 
-            print("Detailed validation passed.")
-        except (SchemaError, ValueError) as e:
-            raise SchemaError(f"Schema validation failed: {e}")
+    def validate_schema(self, schema):
+        # checked and compiled once per distinct schema, later calls hit the registry cache
+        schema_registry.get_validator(schema)
+        print("Detailed validation passed.")
 
 
     def _format_kwargs(self, kwargs):
@@ -68,7 +99,7 @@ class MockCompletions(Completions):
         invalid_key_found = False
         parameters = {}
         for key in kwargs:
-            if key not in keys_to_keep and key not in ["tags", "model", "messages", "use_fallback", "fallback_model", "stream", "save_data"]:
+            if key not in keys_to_keep and key not in ("model", "messages", "stream") + EXTRA_CREATE_KWARGS:
                 warnings.warn(f"Warning: {key} is not a valid parameter for the model. This parameter will be ignored.")
                 invalid_key_found = True
             elif key in keys_to_keep:
@@ -99,43 +130,199 @@ class MockCompletions(Completions):
     def _tags_to_string(self, tags):
         return ",".join(tags)
     
-    def _stream_response(self, response, init_data, fall_back_dict, save_data):
+    def _parse_chunk(self, parser, chunk, content):
+        # sets chunk.parsed_fields to the (path, value) of the json values closed by this chunk
+        # and chunk.parsed to the partial json parsed so far
+        try:
+            chunk.parsed_fields = parser.feed(content) if content else []
+        except ValueError as e:
+            warnings.warn(f"Warning: stream is not valid json, partial parsing stopped: {e}")
+            return None
+        chunk.parsed = parser.value
+        return parser
+
+    def _stream_response(self, response, init_data, fall_back_dict, save_data, guided_schema=None, parse_json=False,
+                         endpoint=None, on_done=None):
+        # endpoint is the Lease of the endpoint for tromero models, the time to the first chunk is its latency.
+        # on_done is called with the number of chunks with content unless the fallback model took over
+        ok = True
+        first_chunk_latency = None
+        completion_tokens = 0
         try:
             full_message = ''
-            for chunk in response:
-                if chunk:
-                    if chunk.choices[0].delta.content and chunk.choices[0].delta.content != '</s>':
-                        full_message += str(chunk.choices[0].delta.content)
-                    yield chunk
+            parser = IncrementalJsonParser() if parse_json else None
+            try:
+                for chunk in response:
+                    if chunk:
+                        if first_chunk_latency is None and endpoint is not None:
+                            first_chunk_latency = time.monotonic() - endpoint.start
+                        content = None
+                        if chunk.choices[0].delta.content and chunk.choices[0].delta.content != '</s>':
+                            content = str(chunk.choices[0].delta.content)
+                            full_message += content
+                            completion_tokens += 1
+                        if parser is not None:
+                            parser = self._parse_chunk(parser, chunk, content)
+                        yield chunk
+            except StreamError as e:
+                ok = not is_endpoint_failure(e)
+                if not fall_back_dict:
+                    raise
+                print(f"Error in stream from model: {e}. Using fallback model.")
+                if endpoint is not None:
+                    endpoint.release(ok=ok)
+                    endpoint = None
+                # the fallback stream saves its own data and validates its own output
+                init_data = {}
+                yield from self._fallback_stream(fall_back_dict)
+                return
+            if guided_schema is not None:
+                if parser is not None and parser.done:
+                    schema_registry.validate(guided_schema, parser.value)
+                else:
+                    schema_registry.validate_json(guided_schema, full_message)
         except Exception as e:
             print("Error streaming response:", e, flush=True)
             raise e
         finally:
+            if endpoint is not None:
+                endpoint.release(ok=ok, ttft=first_chunk_latency if ok else None)
             if init_data != {}:
-                init_data['messages'].append({"role": "assistant", "content": full_message})
+                init_data['messages'] = init_data['messages'] + [{"role": "assistant", "content": full_message}]
                 self._save_data(init_data, save_data)
+                if on_done is not None:
+                    on_done(completion_tokens)
+
 
+    def _fallback_stream(self, fall_back_dict):
+        # the fallback model starts the reply again, its chunks are marked so the consumer can
+        # discard what it received before: restarted is set on the first one, fallback_model on all
+        fallback_model = fall_back_dict['kwargs']['model']
+        restarted = True
+        # batched, if at all, together with the chunks of the original stream
+        kwargs = dict(fall_back_dict['kwargs'], stream_batching=False)
+        for chunk in self.create(*fall_back_dict['args'], **kwargs):
+            chunk.fallback_model = fallback_model
+            chunk.restarted = restarted
+            restarted = False
+            yield chunk
 
     def check_model(self, model):
+        if model in self._client.model_registry:
+            # already resolved as a Tromero model, no need to list the OpenAI models
+            return False
         try:
             models = self._client.models.list()
         except:
             return False
         model_names = [m.id for m in models]
         return model in model_names
+
+    def _preflight(self, model_name, messages, parameters, auto_truncate):
+        # counts the prompt tokens locally and checks them against the context length of the model
+        context_len, tokenizer = self._client._get_model_context(model_name)
+        prompt_tokens = count_message_tokens(messages, tokenizer)
+        if context_len:
+            max_prompt_tokens = context_len - (parameters.get('max_new_tokens') or 0)
+            if prompt_tokens > max_prompt_tokens:
+                if not auto_truncate:
+                    raise PromptTooLongError(f"The prompt is about {prompt_tokens} tokens, more than the {max_prompt_tokens} tokens available for model {model_name}.")
+                messages, prompt_tokens = truncate_messages(messages, max_prompt_tokens, tokenizer)
+        return messages, prompt_tokens
+
+    def _encode_messages(self, kwargs, messages):
+        # long prompts are encoded once, a fallback request reuses the encoding when its messages are unchanged
+        encoded = kwargs.get('_encoded_messages')
+        if encoded is not None and encoded[0] == messages:
+            return encoded[1]
+        return encode_messages(messages)
+
+    def _coalesce_key(self, kwargs, model_name, messages, parameters, stream):
+        # identical deterministic requests share one server call, coalesce=True also shares sampled ones
+        coalesce = kwargs.get('coalesce')
+        if coalesce is None:
+            coalesce = self._client.coalesce_requests and is_deterministic(parameters)
+        if not coalesce:
+            return None
+        return request_key(model_name, messages, parameters, stream)
+
+    def _send_request(self, pool, model_request_name, messages, parameters):
+        # only generations are latency samples, an error answer can come back faster than any generation.
+        # An answer without a generation is a failure of the endpoint, the same as for the fallback
+        endpoint = pool.acquire()
+        start = time.monotonic()
+        latency = None
+        ok = False
+        try:
+            res = tromero_model_create(model_request_name, endpoint.url, messages, self._client.tromero_key, parameters=parameters)
+            ok = 'generated_text' in res
+            if ok:
+                latency = time.monotonic() - start
+            return res
+        except TromeroError as e:
+            ok = not is_endpoint_failure(e)
+            raise
+        finally:
+            pool.release(endpoint, latency, ok)
+
+    def _open_shared_stream(self, pool, model_request_name, messages, parameters):
+        # a shared stream has many consumers, so its endpoint is only tracked up to the connection
+        # and it gives no time to first chunk sample
+        endpoint = pool.acquire(stream=True)
+        ok = True
+        try:
+            res, e = tromero_model_create_stream(model_request_name, endpoint.url, messages, self._client.tromero_key, parameters=parameters,
+                                                 timeout=self._client.stream_stall_timeout)
+            if e:
+                raise e
+            return res
+        except TromeroError as e:
+            ok = not is_endpoint_failure(e)
+            raise
+        finally:
+            pool.release(endpoint, ok=ok)
+
+    def _fallback_kwargs(self, kwargs, fallback_model):
+        # a new request for the fallback model, the kwargs of the original request are left untouched
+        fallback_kwargs = dict(kwargs)
+        fallback_kwargs['model'] = fallback_model
+        fallback_kwargs['use_fallback'] = False
+        fallback_kwargs['_fallback'] = True
+        return fallback_kwargs
+
+    def _record_usage(self, model, tags, messages, prompt_tokens, completion_tokens, start_time, is_fallback, coalesced=False):
+        if coalesced:
+            # the tokens of a shared server call are counted once, by the caller that sent it
+            prompt_tokens = completion_tokens = 0
+        elif prompt_tokens is None and self._client.usage.has_budget(tags):
+            # budgets count the prompt too, estimate it when neither preflight nor the model counted it
+            prompt_tokens = count_message_tokens(messages)
+        self._client.usage.record(model, tags, prompt_tokens, completion_tokens, time.monotonic() - start_time, is_fallback)
     
     def create(self, *args, **kwargs):
+        start_time = time.monotonic()
         messages = kwargs['messages']
         formatted_messages =  self._format_messages(messages)
+        tags = kwargs.get('tags', [])
+        # a tag with a used up budget blocks the request or sends it to a cheaper model
+        kwargs['model'] = self._client.usage.budget_model(kwargs['model'], tags)
         model = kwargs['model']
         stream = kwargs.get('stream', False)
-        tags = kwargs.get('tags', [])
+        is_fallback = kwargs.get('_fallback', False)
         send_kwargs = {}
         use_fallback = kwargs.get('use_fallback', True)
         fallback_model = kwargs.get('fallback_model', '')
         save_data = kwargs.get('save_data', self._client.save_data_default)
+        # validate the generated json against guided_schema before handing it back
+        output_schema = kwargs.get('guided_schema') if kwargs.get('validate_output', False) else None
+        # parse guided_schema streams incrementally so consumers can use fields as they close
+        parse_json = kwargs.get('parse_json', 'guided_schema' in kwargs)
         
-        openai_kwargs = {k: v for k, v in kwargs.items() if k not in ['tags', 'use_fallback', 'fallback_model', 'save_data']}
+        openai_kwargs = {k: v for k, v in kwargs.items() if k not in EXTRA_CREATE_KWARGS}
+        stream_endpoint = None
+        prompt_tokens = None
+        coalesce_key = None
+        sent = []  # set if this call sent the request, a coalesced follower only shares the result
         if self.check_model(kwargs['model']):
             res = Completions.create(self, *args, **openai_kwargs)  
             send_kwargs = openai_kwargs
@@ -143,29 +330,64 @@ class MockCompletions(Completions):
             formatted_kwargs = self._format_kwargs(kwargs)
             send_kwargs = formatted_kwargs
             model_name = model
-            if model_name not in self._client.model_urls:
-                url, base_model = get_model_url(model_name, self._client.tromero_key, self._client.location_preference)
-                self._client.model_urls[model_name] = url
-                self._client.is_base_model[model_name] = base_model
-            model_request_name = model_name if not self._client.is_base_model[model_name] else "NO_ADAPTER"
-            if stream:
-                res, e =  tromero_model_create_stream(model_request_name, self._client.model_urls[model_name], formatted_messages, self._client.tromero_key, parameters=formatted_kwargs)
+            pool, is_base_model = self._client._get_model_url(model_name)
+            model_request_name = model_name if not is_base_model else "NO_ADAPTER"
+            if output_schema is not None:
+                schema_registry.get_validator(output_schema)
+            auto_truncate = kwargs.get('auto_truncate', False)
+            if self._client.preflight or auto_truncate:
+                formatted_messages, prompt_tokens = self._preflight(model_name, formatted_messages, formatted_kwargs, auto_truncate)
+            encoded_messages = self._encode_messages(kwargs, formatted_messages)
+            kwargs['_encoded_messages'] = (formatted_messages, encoded_messages)
+            coalesce_key = self._coalesce_key(kwargs, model_name, formatted_messages, formatted_kwargs, stream)
+            if stream and coalesce_key:
+                def open_stream():
+                    sent.append(True)
+                    return self._open_shared_stream(pool, model_request_name, encoded_messages, formatted_kwargs)
+                try:
+                    res = self._client.single_flight.share_stream(coalesce_key, open_stream)
+                except TromeroError:
+                    if not (use_fallback and fallback_model):
+                        raise
+                    print("Error in making request to model. Using fallback model.")
+                    return self.create(*args, **self._fallback_kwargs(kwargs, fallback_model))
+            elif stream:
+                lease = pool.lease(stream=True)
+                try:
+                    res, e =  tromero_model_create_stream(model_request_name, lease.endpoint.url, encoded_messages, self._client.tromero_key, parameters=formatted_kwargs,
+                                                          timeout=self._client.stream_stall_timeout)
+                except TromeroError as error:
+                    # no answer in time or no connection, falls back like an error status
+                    res, e = None, error
                 if e:
+                    lease.release(ok=not is_endpoint_failure(e))
                     if use_fallback and fallback_model:
                         print("Error in making request to model. Using fallback model.")
-                        kwargs['model'] = fallback_model
-                        kwargs['use_fallback'] = False
-                        return self.create(*args, **kwargs)
+                        return self.create(*args, **self._fallback_kwargs(kwargs, fallback_model))
+                    raise e
+                else:
+                    stream_endpoint = lease
 
             else:
-                res = tromero_model_create(model_request_name, self._client.model_urls[model_name], formatted_messages, self._client.tromero_key, parameters=formatted_kwargs)
+                def send():
+                    sent.append(True)
+                    return self._send_request(pool, model_request_name, encoded_messages, formatted_kwargs)
+                res = self._client.single_flight.do(coalesce_key, send) if coalesce_key else send()
                 # check if res has field 'generated_text'
                 if 'generated_text' in res:
                     generated_text = res['generated_text']
                     usage = res['usage']
+                    if output_schema is not None:
+                        schema_registry.validate_json(output_schema, generated_text)
                     res = mock_openai_format(generated_text, usage)
+                    if res.usage.prompt_tokens is None:
+                        res.usage.prompt_tokens = prompt_tokens
 
+        coalesced = coalesce_key is not None and not sent
         if hasattr(res, 'choices'):
+            usage = getattr(res, 'usage', None)
+            self._record_usage(model, tags, formatted_messages, getattr(usage, 'prompt_tokens', prompt_tokens),
+                               getattr(usage, 'completion_tokens', None), start_time, is_fallback, coalesced=coalesced)
             for choice in res.choices:
                 formatted_choice = self._choice_to_dict(choice)
                 data = {"messages": formatted_messages + [formatted_choice['message']],
@@ -186,19 +408,25 @@ class MockCompletions(Completions):
                                 }
             fall_back_dict = {}
             if use_fallback and fallback_model:
-                kwargs['model'] = fallback_model
-                kwargs['use_fallback'] = False
                 fall_back_dict = {
                     'args': args,
-                    'kwargs': kwargs
+                    'kwargs': self._fallback_kwargs(kwargs, fallback_model)
                 }
-            return self._stream_response(res, init_data, fall_back_dict, save_data)
+            on_done = lambda completion_tokens: self._record_usage(model, tags, formatted_messages, prompt_tokens, completion_tokens,
+                                                                   start_time, is_fallback, coalesced=coalesced)
+            chunks = self._stream_response(res, init_data, fall_back_dict, save_data, guided_schema=output_schema, parse_json=parse_json,
+                                           endpoint=stream_endpoint, on_done=on_done)
+            batching = batching_options(kwargs.get('stream_batching', self._client.stream_batching))
+            if batching is not None:
+                interval, max_bytes = batching
+                chunks = batch_chunks(chunks, interval=interval, max_bytes=max_bytes)
+            if stream_endpoint is not None:
+                return ModelStream(chunks, stream_endpoint, res)
+            return chunks
         else:
             if use_fallback and fallback_model:
                 print("Error in making request to model. Using fallback model.")
-                kwargs['model'] = fallback_model
-                kwargs['use_fallback'] = False
-                return self.create(*args, **kwargs)
+                return self.create(*args, **self._fallback_kwargs(kwargs, fallback_model))
 
         return res
 
@@ -213,17 +441,164 @@ class MockChat(Chat):
 
 
 class Tromero(OpenAI):
+    """Client for OpenAI and Tromero models.
+
+    A single client can be shared between threads. The per model state (resolved urls) lives in a
+    ModelRegistry, which resolves each model once even when many threads request it at the same time."""
     chat: MockChat
-    def __init__(self, tromero_key, api_key="", save_data_default=False, location_preference=None):
+    def __init__(self, tromero_key, api_key="", save_data_default=False, location_preference=None,
+                 warmup_models=None, warmup_generate=False, load_balancing="ewma", coalesce_requests=False,
+                 preflight=False, local_data_dir=None, url_cache_path=None, stream_stall_timeout=60,
+                 stream_batching=None):
         super().__init__(api_key=api_key)
         self.current_prompt = []
-        self.model_urls = {}
-        self.is_base_model = {}
+        self.model_registry = ModelRegistry(strategy=load_balancing)
+        self.coalesce_requests = coalesce_requests
+        self.single_flight = SingleFlight()
+        self.preflight = preflight
+        # saved data is written to local shards instead of being sent to Tromero
+        self.data_sink = LocalDataSink(local_data_dir) if local_data_dir else None
+        # resolved urls shared with other processes, e.g. forked workers
+        self.url_cache = FileUrlCache(url_cache_path) if url_cache_path else None
+        # seconds without a stream event before the stream counts as failed and falls back
+        self.stream_stall_timeout = stream_stall_timeout
+        # group stream tokens into larger chunks: True, or {"interval": seconds, "max_bytes": n}
+        self.stream_batching = stream_batching
+        # tokens, requests and latency by model, tag and fallback, with optional budgets per tag
+        self.usage = UsageTracker()
+        self._model_contexts = {}
         self.tromero_key = tromero_key
         self.chat = MockChat(self)
         self.save_data_default = save_data_default
-        self.tromero_models = TromeroModels(tromero_key)
+        self.location_preference = location_preference
+        self.tromero_models = TromeroModels(tromero_key, on_model_ready=self._cache_model_url)
         self.fine_tuning_jobs = FineTuningJob(tromero_key)
         self.data = TromeroData(tromero_key)
         self.datasets = Datasets(tromero_key)
-        self.location_preference = location_preference
+        self.warmup_times = {}
+        forking.register(self)
+        if warmup_models:
+            self.warmup(warmup_models, generate=warmup_generate)
+
+    def _after_fork_in_child(self):
+        # the pooled connections of the OpenAI http client are shared with the parent, the child opens its own.
+        # The old client stays referenced: closing it, also when it is garbage collected, would close the parent's sockets
+        self._orphaned_http_client = self._client
+        self._client = SyncHttpxClientWrapper(base_url=self._base_url, timeout=self.timeout, proxies=self._proxies,
+                                              transport=self._transport, limits=self._limits, follow_redirects=True)
+
+    @property
+    def model_urls(self):
+        """The url of each resolved model, assigning a url sets the model's endpoints"""
+        return ModelUrls(self.model_registry)
+
+    @model_urls.setter
+    def model_urls(self, urls):
+        urls = dict(urls)
+        for model_name in self.model_registry.urls():
+            if model_name not in urls:
+                self.model_registry.remove(model_name)
+        for model_name, url in urls.items():
+            self.model_registry.set(model_name, url)
+
+    @property
+    def is_base_model(self):
+        """Whether each resolved model is a base model, assignments write through to the model registry"""
+        return BaseModels(self.model_registry)
+
+    @is_base_model.setter
+    def is_base_model(self, flags):
+        for model_name, is_base_model in dict(flags).items():
+            self.model_registry.set_base_model(model_name, is_base_model)
+
+    def _cache_model_url(self, model_name, url, base_model):
+        urls = [url]
+        if isinstance(self.location_preference, (list, tuple)):
+            urls, base_model = self._resolve_model_url(model_name)
+        self.model_registry.set(model_name, urls, base_model)
+
+    def _resolve_model_url(self, model_name):
+        # urls are per account, clients with different keys can share the cache file
+        key_hash = hashlib.sha256(self.tromero_key.encode("utf-8")).hexdigest()[:16]
+        cache_key = f"{key_hash}|{model_name}|{self.location_preference}"
+        if self.url_cache is not None:
+            cached = self.url_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        urls, base_model = get_model_urls(model_name, self.tromero_key, self.location_preference)
+        if self.url_cache is not None:
+            self.url_cache.set(cache_key, urls, base_model)
+        return urls, base_model
+
+    def _fetch_model_context(self, model_name):
+        """Returns (context, seconds to keep it), forever unless the answer may change on a retry"""
+        try:
+            info = get_model_request(model_name, self.tromero_key)["message"]
+        except TromeroError as e:
+            if e.status_code is not None and 400 <= e.status_code < 500:
+                # base models and models of other users have no info, only the estimate is used
+                return (None, get_tokenizer()), None
+            # the api was unreachable or failed, use the estimate for now and ask again later
+            return (None, get_tokenizer()), MODEL_CONTEXT_RETRY_SECONDS
+        base_model_data = info.get("base_model_data") or {}
+        return (base_model_data.get("supported_context_len"),
+                get_tokenizer(base_model_data.get("model_name"), base_model_data.get("hf_repo"))), None
+
+    def _get_model_context(self, model_name):
+        """Returns the context length of the model (None if unknown) and the tokenizer to count its prompts"""
+        cached = self._model_contexts.get(model_name)
+        if cached is None or (cached[1] is not None and time.monotonic() >= cached[1]):
+            context, ttl = self.single_flight.do(("context", model_name), lambda: self._fetch_model_context(model_name))
+            cached = (context, None if ttl is None else time.monotonic() + ttl)
+            self._model_contexts[model_name] = cached
+        return cached[0]
+
+    def count_tokens(self, model, messages):
+        """Estimates the prompt tokens of messages for a Tromero model without calling it"""
+        return count_message_tokens(messages, self._get_model_context(model)[1])
+
+    def add_model_endpoints(self, model_name, urls, is_base_model=False):
+        """Sets the replica urls requests to the model are balanced across, instead of resolving them"""
+        self.model_registry.set(model_name, urls, is_base_model)
+
+    def endpoint_stats(self):
+        """Outstanding requests, latency EWMA, request and failure counts of every endpoint, by model"""
+        return self.model_registry.stats()
+
+    def _get_model_url(self, model_name):
+        return self.model_registry.resolve(model_name, self._resolve_model_url)
+
+    def _warmup_model(self, model_name, generate):
+        start = time.monotonic()
+        pool, is_base_model = self._get_model_url(model_name)
+        for model_url in pool.urls:
+            open_connection(model_url)
+            if generate:
+                model_request_name = model_name if not is_base_model else "NO_ADAPTER"
+                if not probe_model(model_request_name, model_url, self.tromero_key):
+                    raise TromeroError(f"Warm-up generation failed for model {model_name} at {model_url}")
+        return time.monotonic() - start
+
+    def warmup(self, model_names, generate=False, max_workers=8):
+        """Resolves the model urls and opens pooled connections to them concurrently, optionally
+        firing a one token generation so the server loads the adapter.
+        Returns the warm-up time in seconds for each model, None if the warm-up failed."""
+        if type(model_names) == str:
+            model_names = [model_names]
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(model_names)))) as executor:
+            futures = {model_name: executor.submit(self._warmup_model, model_name, generate) for model_name in model_names}
+        for model_name, future in futures.items():
+            try:
+                self.warmup_times[model_name] = future.result()
+            except Exception as e:
+                print(f"Warm-up failed for model {model_name}: {e}")
+                self.warmup_times[model_name] = None
+        return {model_name: self.warmup_times[model_name] for model_name in model_names}
+
+    def wait_for_models(self, model_names, timeout=900, probe=True, **kwargs):
+        """Waits until the models are serving and warms the url cache so the first request skips url resolution"""
+        location_preference = self.location_preference
+        if isinstance(location_preference, (list, tuple)):
+            location_preference = location_preference[0]
+        return self.tromero_models.wait_until_ready(model_names, timeout=timeout, probe=probe,
+                                                    location_preference=location_preference, **kwargs)